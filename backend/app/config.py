@@ -1,4 +1,7 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
 from pathlib import Path
+from types import MappingProxyType
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
@@ -8,17 +11,50 @@ UNIFIED_FEATURES = [
     "fine_aggregate", "coarse_aggregate", "age",
 ]
 
-DATASETS = {
-    "concrete": {
-        "file": "concrete.csv",
-        "description": "UCI Concrete Compressive Strength Dataset",
-        "source_label": "UCI Concrete",
-        "features": [
+
+@dataclass(frozen=True, slots=True)
+class DatasetSpec:
+    file: str
+    description: str
+    features: tuple[str, ...]
+    target: str
+    source_label: str = ""
+    units: Mapping[str, str] = field(default_factory=dict)
+    # Row count, filled in once the data has been read
+    num_samples: int | None = None
+
+    def __post_init__(self):
+        # Accept lists/dicts (e.g. from JSON metadata) but store read-only copies
+        object.__setattr__(self, "features", tuple(self.features))
+        object.__setattr__(self, "units", MappingProxyType(dict(self.units)))
+
+    def to_meta(self) -> dict:
+        """JSON-serializable metadata, without the local file name."""
+        return {
+            "description": self.description,
+            "source_label": self.source_label,
+            "features": list(self.features),
+            "target": self.target,
+            "units": dict(self.units),
+            "num_samples": self.num_samples,
+        }
+
+    def with_num_samples(self, num_samples: int) -> "DatasetSpec":
+        return replace(self, num_samples=num_samples)
+
+
+# Registry of available datasets; uploaded datasets are added at runtime.
+DATASETS: dict[str, DatasetSpec] = {
+    "concrete": DatasetSpec(
+        file="concrete.csv",
+        description="UCI Concrete Compressive Strength Dataset",
+        source_label="UCI Concrete",
+        features=(
             "cement", "blast_furnace_slag", "fly_ash", "water",
             "superplasticizer", "coarse_aggregate", "fine_aggregate", "age",
-        ],
-        "target": "compressive_strength",
-        "units": {
+        ),
+        target="compressive_strength",
+        units={
             "cement": "kg/m³",
             "blast_furnace_slag": "kg/m³",
             "fly_ash": "kg/m³",
@@ -29,17 +65,17 @@ DATASETS = {
             "age": "days",
             "compressive_strength": "MPa",
         },
-    },
-    "concrete_xai": {
-        "file": "concrete_xai.csv",
-        "description": "ConcreteXAI Extended Dataset (synthetic)",
-        "source_label": "ConcreteXAI",
-        "features": [
+    ),
+    "concrete_xai": DatasetSpec(
+        file="concrete_xai.csv",
+        description="ConcreteXAI Extended Dataset (synthetic)",
+        source_label="ConcreteXAI",
+        features=(
             "cement", "fly_ash", "water", "superplasticizer",
             "fine_aggregate", "coarse_aggregate", "age",
-        ],
-        "target": "compressive_strength",
-        "units": {
+        ),
+        target="compressive_strength",
+        units={
             "cement": "kg/m³",
             "fly_ash": "kg/m³",
             "water": "kg/m³",
@@ -49,17 +85,17 @@ DATASETS = {
             "age": "days",
             "compressive_strength": "MPa",
         },
-    },
-    "geopolymer": {
-        "file": "geopolymer.csv",
-        "description": "Mendeley Geopolymer Concrete Dataset (synthetic)",
-        "source_label": "Mendeley Geopolymer",
-        "features": [
+    ),
+    "geopolymer": DatasetSpec(
+        file="geopolymer.csv",
+        description="Mendeley Geopolymer Concrete Dataset (synthetic)",
+        source_label="Mendeley Geopolymer",
+        features=(
             "cement", "fly_ash", "water", "superplasticizer",
             "fine_aggregate", "coarse_aggregate", "age",
-        ],
-        "target": "compressive_strength",
-        "units": {
+        ),
+        target="compressive_strength",
+        units={
             "cement": "kg/m³",
             "fly_ash": "kg/m³",
             "water": "kg/m³",
@@ -69,7 +105,7 @@ DATASETS = {
             "age": "days",
             "compressive_strength": "MPa",
         },
-    },
+    ),
 }
 
 BUILTIN_DATASETS = set(DATASETS.keys())
@@ -78,3 +114,14 @@ import os
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "")
 SUPABASE_BUCKET = os.environ.get("SUPABASE_BUCKET", "models")
+
+SHAP_CACHE_DIR = Path(os.environ.get("SHAP_CACHE_DIR", DATA_DIR / "shap_cache"))
+# Oldest (least recently used) SHAP cache files beyond this count are pruned
+SHAP_CACHE_MAX_FILES = int(os.environ.get("SHAP_CACHE_MAX_FILES", "64"))
+# Cap on test rows explained per model (0 = all rows for tree models)
+XAI_SAMPLE_LIMIT = int(os.environ.get("XAI_SAMPLE_LIMIT", "0"))
+# Parse CSVs with pyarrow's multithreaded reader (FAST_IO=1). Off by default:
+# pyarrow rounds some cells one ULP away from pandas, which changes split ties
+# and so the models trained on the built-in datasets
+FAST_IO = os.environ.get("FAST_IO", "0") == "1"
+ARROW_CACHE_DIR = Path(os.environ.get("ARROW_CACHE_DIR", DATA_DIR / "arrow_cache"))
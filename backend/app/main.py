@@ -1,25 +1,35 @@
-import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse, Response
+from .middleware import AllowAllCORSMiddleware
 from .routers import datasets, models, explanations, exploration, configurations
 
+
+async def _open_http_client():
+    # Created inside the running loop, so pooled connections belong to it
+    app.state.http_client = datasets.new_http_client()
+
+
+async def _close_http_client():
+    await app.state.http_client.aclose()
+
+
 app = FastAPI(
     title="Material Design Intelligence (MDI)",
     description="AI-assisted material design platform - MVP",
     version="0.2.0",
+    default_response_class=ORJSONResponse,
+    on_startup=[_open_http_client],
+    on_shutdown=[_close_http_client],
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(AllowAllCORSMiddleware)
 
 app.include_router(datasets.router)
 app.include_router(models.router)
@@ -29,15 +39,57 @@ app.include_router(configurations.router)
 
 # Serve frontend static files if the build exists (production / Docker)
 STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names are content-hashed by Vite, so never change."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+STATIC_CACHE_SIZE = 64
+_static_cache: OrderedDict[Path, tuple[float, bytes, str, str]] = OrderedDict()
+# serve_spa runs in the threadpool, so the cache is shared between threads
+_static_lock = threading.Lock()
+
+
+def _load_static(path: Path) -> tuple[float, bytes, str, str]:
+    """Return (mtime, content, media_type, etag), re-reading only on mtime change."""
+    mtime = path.stat().st_mtime
+    with _static_lock:
+        entry = _static_cache.get(path)
+        if entry and entry[0] == mtime:
+            _static_cache.move_to_end(path)
+            return entry
+    content = path.read_bytes()
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    etag = f'"{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+    entry = (mtime, content, media_type, etag)
+    with _static_lock:
+        _static_cache[path] = entry
+        _static_cache.move_to_end(path)
+        if len(_static_cache) > STATIC_CACHE_SIZE:
+            _static_cache.popitem(last=False)
+    return entry
+
+
 if STATIC_DIR.is_dir():
-    app.mount("/assets", StaticFiles(directory=STATIC_DIR / "assets"), name="static-assets")
+    app.mount("/assets", ImmutableStaticFiles(directory=STATIC_DIR / "assets"), name="static-assets")
 
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
+    def serve_spa(full_path: str, request: Request):
+        # Sync, so FastAPI runs the file stat/read in its threadpool
         file_path = STATIC_DIR / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-        return FileResponse(STATIC_DIR / "index.html")
+        if not file_path.is_file():
+            file_path = STATIC_DIR / "index.html"
+        _, content, media_type, etag = _load_static(file_path)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=content, media_type=media_type, headers=headers)
 else:
     @app.get("/")
     def root():
@@ -0,0 +1,71 @@
+"""Minimal CORS handling for an API that accepts every origin."""
+
+ALLOW_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+MAX_AGE = b"600"
+
+
+class AllowAllCORSMiddleware:
+    """ASGI middleware equivalent to CORSMiddleware(allow_origins=["*"],
+    allow_credentials=True, allow_methods=["*"], allow_headers=["*"]).
+
+    Because every origin is allowed there is nothing to match: the request
+    Origin is echoed back (required when credentials are allowed) and
+    preflight requests are answered directly.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value
+            elif key == b"access-control-request-method":
+                request_method = value
+            elif key == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = [
+            (b"access-control-allow-origin", origin),
+            (b"access-control-allow-credentials", b"true"),
+        ]
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = cors_headers + [
+                (b"vary", b"Origin"),
+                (b"access-control-allow-methods", ALLOW_METHODS),
+                (b"access-control-max-age", MAX_AGE),
+                (b"content-length", b"2"),
+                (b"content-type", b"text/plain; charset=utf-8"),
+            ]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                # Extend an existing Vary rather than sending the header twice
+                for i, (key, value) in enumerate(headers):
+                    if key.lower() == b"vary":
+                        headers[i] = (key, value + b", Origin")
+                        break
+                else:
+                    headers.append((b"vary", b"Origin"))
+                message["headers"] = headers + cors_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from ..services.configuration_service import configuration_service
 from ..models.schemas import SaveConfigurationRequest, ConfigurationItem
 
-router = APIRouter(prefix="/api/configurations", tags=["configurations"])
+router = APIRouter(
+    prefix="/api/configurations",
+    tags=["configurations"],
+    on_shutdown=[configuration_service.flush],
+)
 
 
 @router.post("", response_model=ConfigurationItem)
-def save_configuration(req: SaveConfigurationRequest):
+def save_configuration(req: SaveConfigurationRequest, background_tasks: BackgroundTasks):
+    background_tasks.add_task(configuration_service.flush)
     return configuration_service.save(
         label=req.label,
         values=req.values,
@@ -25,7 +30,8 @@ def list_configurations():
 
 
 @router.patch("/{config_id}/validate", response_model=ConfigurationItem)
-def mark_validation_candidate(config_id: str):
+def mark_validation_candidate(config_id: str, background_tasks: BackgroundTasks):
+    background_tasks.add_task(configuration_service.flush)
     try:
         return configuration_service.mark_as_validation_candidate(config_id)
     except ValueError as e:
@@ -33,7 +39,8 @@ def mark_validation_candidate(config_id: str):
 
 
 @router.delete("/{config_id}")
-def delete_configuration(config_id: str):
+def delete_configuration(config_id: str, background_tasks: BackgroundTasks):
+    background_tasks.add_task(configuration_service.flush)
     try:
         configuration_service.delete(config_id)
         return {"status": "deleted", "id": config_id}
@@ -41,11 +48,10 @@ def delete_configuration(config_id: str):
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@router.get("/export", response_class=PlainTextResponse)
+@router.get("/export", response_class=StreamingResponse)
 def export_configurations(only_candidates: bool = Query(default=False)):
-    csv_content = configuration_service.export_csv(only_candidates=only_candidates)
-    return PlainTextResponse(
-        content=csv_content,
+    return StreamingResponse(
+        configuration_service.iter_export_csv(only_candidates=only_candidates),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=configurations.csv"},
     )
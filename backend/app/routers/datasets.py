@@ -1,8 +1,8 @@
-from io import StringIO
+from io import BytesIO
 
 import httpx
 import pandas as pd
-from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.responses import Response
 
 from ..models.schemas import (
@@ -17,14 +17,33 @@ from ..services.data_service import data_service
 
 router = APIRouter(prefix="/api/datasets", tags=["datasets"])
 
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+
+def new_http_client() -> httpx.AsyncClient:
+    """Client for URL uploads; the app keeps one on app.state for its lifetime,
+    so repeated uploads reuse pooled connections (and TLS sessions)."""
+    return httpx.AsyncClient(follow_redirects=True, timeout=30)
+
+
+async def _download(client: httpx.AsyncClient, url: str) -> BytesIO:
+    buf = BytesIO()
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            buf.write(chunk)
+    buf.seek(0)
+    return buf
+
 
 @router.get("", response_model=list[DatasetInfo])
 def list_datasets():
-    return data_service.list_datasets()
+    return [DatasetInfo.model_construct(**d) for d in data_service.list_datasets()]
 
 
 @router.post("/upload", response_model=UploadDatasetResponse)
 async def upload_dataset(
+    request: Request,
     name: str = Form(...),
     description: str = Form(""),
     target: str = Form(""),
@@ -36,13 +55,18 @@ async def upload_dataset(
 
     try:
         if url:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, follow_redirects=True, timeout=30)
-                resp.raise_for_status()
-            df = pd.read_csv(StringIO(resp.text))
+            client = getattr(request.app.state, "http_client", None)
+            if client is not None:
+                buf = await _download(client, url)
+            else:
+                # App started without its startup hooks (e.g. a bare TestClient)
+                async with new_http_client() as client:
+                    buf = await _download(client, url)
+            df = pd.read_csv(buf, engine="pyarrow")
         else:
-            content = await file.read()
-            df = pd.read_csv(StringIO(content.decode("utf-8")))
+            # UploadFile is spooled to disk past 1 MB; parse it in place.
+            await file.seek(0)
+            df = pd.read_csv(file.file, engine="pyarrow")
     except httpx.HTTPError as e:
         raise HTTPException(status_code=400, detail=f"Failed to download URL: {e}")
     except Exception as e:
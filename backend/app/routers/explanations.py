@@ -1,5 +1,4 @@
 from fastapi import APIRouter, HTTPException
-from ..services.xai_service import xai_service
 from ..models.schemas import (
     ShapSummaryData, FeatureImportanceData,
     PredictRequest, PredictionExplanation, DependenceData,
@@ -8,10 +7,17 @@ from ..models.schemas import (
 router = APIRouter(prefix="/api/explanations", tags=["explanations"])
 
 
+def _xai_service():
+    # Imported on first use, so app startup does not load sklearn/shap
+    from ..services.xai_service import xai_service
+
+    return xai_service
+
+
 @router.post("/{model_id}/compute")
 def compute_shap(model_id: str):
     try:
-        xai_service.compute_shap_values(model_id)
+        _xai_service().compute_shap_values(model_id)
         return {"status": "ok", "model_id": model_id}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -20,7 +26,7 @@ def compute_shap(model_id: str):
 @router.get("/{model_id}/summary", response_model=ShapSummaryData)
 def get_summary(model_id: str):
     try:
-        return xai_service.get_summary_plot_data(model_id)
+        return _xai_service().get_summary_plot_data(model_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -28,7 +34,7 @@ def get_summary(model_id: str):
 @router.get("/{model_id}/importance", response_model=FeatureImportanceData)
 def get_importance(model_id: str):
     try:
-        return xai_service.get_feature_importance(model_id)
+        return _xai_service().get_feature_importance(model_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -37,7 +43,7 @@ def get_importance(model_id: str):
 def explain_prediction(model_id: str, req: PredictRequest):
     try:
         input_data = req.model_dump()
-        return xai_service.explain_prediction(model_id, input_data)
+        return _xai_service().explain_prediction(model_id, input_data)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -45,6 +51,6 @@ def explain_prediction(model_id: str, req: PredictRequest):
 @router.get("/{model_id}/dependence/{feature}", response_model=DependenceData)
 def get_dependence(model_id: str, feature: str):
     try:
-        return xai_service.get_dependence_data(model_id, feature)
+        return _xai_service().get_dependence_data(model_id, feature)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
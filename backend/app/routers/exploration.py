@@ -1,5 +1,4 @@
 from fastapi import APIRouter, HTTPException
-from ..services.exploration_service import exploration_service
 from ..models.schemas import (
     ParametricSweepRequest, ParametricSweepResponse,
     MultivariableRequest, MultivariableResponse,
@@ -9,10 +8,17 @@ from ..models.schemas import (
 router = APIRouter(prefix="/api/exploration", tags=["exploration"])
 
 
+def _exploration_service():
+    # Imported on first use, so app startup does not load sklearn/shap
+    from ..services.exploration_service import exploration_service
+
+    return exploration_service
+
+
 @router.post("/parametric", response_model=ParametricSweepResponse)
 def parametric_sweep(req: ParametricSweepRequest):
     try:
-        return exploration_service.parametric_sweep(
+        return _exploration_service().parametric_sweep(
             model_id=req.model_id,
             base_config=req.base_config,
             sweep_feature=req.sweep_feature,
@@ -28,7 +34,7 @@ def parametric_sweep(req: ParametricSweepRequest):
 def multivariable_exploration(req: MultivariableRequest):
     try:
         ranges = [r.model_dump() for r in req.variable_ranges]
-        return exploration_service.multivariable_exploration(
+        return _exploration_service().multivariable_exploration(
             model_id=req.model_id,
             base_config=req.base_config,
             variable_ranges=ranges,
@@ -40,7 +46,7 @@ def multivariable_exploration(req: MultivariableRequest):
 @router.post("/compare", response_model=CompareResponse)
 def compare_configurations(req: CompareRequest):
     try:
-        return exploration_service.compare_configurations(
+        return _exploration_service().compare_configurations(
             model_id=req.model_id,
             configurations=req.configurations,
             labels=req.labels,
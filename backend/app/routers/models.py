@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from ..services.model_service import model_service
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
 from ..models.schemas import (
     TrainRequest, ModelInfo, ModelMetrics,
     PredictRequest, PredictResponse,
@@ -10,15 +12,44 @@ from ..models.schemas import (
 router = APIRouter(prefix="/api/models", tags=["models"])
 
 
+def _model_service():
+    # Imported on first use, so app startup does not load sklearn/shap
+    from ..services.model_service import model_service
+
+    return model_service
+
+
+def _json_body(model: type[BaseModel]):
+    """Dependency that validates the raw request body in one pydantic-core pass,
+    skipping the stdlib json.loads + dict validation FastAPI does by default."""
+    async def parse(request: Request) -> BaseModel:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**err, "loc": ("body", *err["loc"])}
+                for err in e.errors(include_url=False)
+            ])
+    return parse
+
+
+def _body_openapi(model: type[BaseModel]) -> dict:
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    return {"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": schema}},
+    }}
+
+
 @router.get("", response_model=list[ModelInfo])
 def list_models():
-    return model_service.list_models()
+    return _model_service().list_models()
 
 
 @router.post("/train", response_model=ModelInfo)
 def train_model(req: TrainRequest):
     try:
-        return model_service.train(
+        return _model_service().train(
             algorithm=req.algorithm,
             test_size=req.test_size,
             n_estimators=req.n_estimators,
@@ -37,20 +68,28 @@ def train_model(req: TrainRequest):
 @router.get("/{model_id}/metrics", response_model=ModelMetrics)
 def get_metrics(model_id: str):
     try:
-        return model_service.get_metrics(model_id)
+        return _model_service().get_metrics(model_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@router.post("/{model_id}/predict", response_model=PredictResponse)
-def predict(model_id: str, req: PredictRequest):
+@router.post(
+    "/{model_id}/predict",
+    response_model=PredictResponse,
+    openapi_extra=_body_openapi(PredictRequest),
+)
+def predict(model_id: str, req: PredictRequest = Depends(_json_body(PredictRequest))):
     try:
-        input_data = req.model_dump()
-        prediction = model_service.predict(model_id, input_data)
+        # Columns in the model's own feature order, which predict_array assumes
+        features = _model_service().get_model_entry(model_id)["feature_names"]
+        X = np.fromiter(
+            (getattr(req, f) for f in features), dtype=np.float64, count=len(features),
+        ).reshape(1, -1)
+        prediction = _model_service().predict_array(model_id, X)
         return {
             "prediction": prediction,
             "model_id": model_id,
-            "input_data": input_data,
+            "input_data": dict(zip(features, X[0].tolist())),
         }
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -63,18 +102,27 @@ def predict(model_id: str, req: PredictRequest):
 def predict_with_uncertainty(model_id: str, req: PredictRequest):
     try:
         input_data = req.model_dump()
-        return model_service.predict_with_uncertainty(model_id, input_data)
+        return _model_service().predict_with_uncertainty(model_id, input_data)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@router.post("/{model_id}/predict/batch", response_model=BatchPredictResponse)
-def predict_batch(model_id: str, req: BatchPredictRequest):
+@router.post(
+    "/{model_id}/predict/batch",
+    response_model=BatchPredictResponse,
+    openapi_extra=_body_openapi(BatchPredictRequest),
+)
+def predict_batch(
+    model_id: str,
+    req: BatchPredictRequest = Depends(_json_body(BatchPredictRequest)),
+):
     try:
-        predictions = []
-        for sample in req.samples:
-            pred = model_service.predict(model_id, sample.model_dump())
-            predictions.append(pred)
+        features = _model_service().get_model_entry(model_id)["feature_names"]
+        X = np.array(
+            [[getattr(s, f) for f in features] for s in req.samples],
+            dtype=np.float64,
+        ).reshape(len(req.samples), len(features))
+        predictions = _model_service().predict_batch(model_id, X)
         return {"predictions": predictions, "model_id": model_id}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -1,31 +1,126 @@
-import uuid
-import json
-import io
 import csv
+import io
+import os
+import threading
+import uuid
 from pathlib import Path
+
+import orjson
 from ..config import DATA_DIR
 
 
-STORE_PATH = DATA_DIR / "configurations.json"
+STORE_PATH = DATA_DIR / "configurations.jsonl"
+LEGACY_STORE_PATH = DATA_DIR / "configurations.json"
+
+# Rewrite the log once it holds this many more records than live configurations
+COMPACT_SLACK = 256
 
 
 class ConfigurationService:
     def __init__(self):
         self._configs: dict[str, dict] = {}
+        # Records appended to the log on the next flush; each is either a full
+        # item or a {"id": ..., "deleted": True} tombstone
+        self._pending: list[dict] = []
+        self._log_records = 0
+        # Set when the log had unreadable records; compacting would then drop
+        # them for good, so only appends are allowed
+        self._load_failed = False
+        self._flush_lock = threading.Lock()
+        # Guards _configs/_pending changes against flush swapping _pending out
+        self._pending_lock = threading.Lock()
         self._load_from_disk()
 
     def _load_from_disk(self):
-        if STORE_PATH.exists():
+        if not STORE_PATH.exists():
+            self._load_legacy()
+            return
+        with open(STORE_PATH, "rb") as f:
+            lines = f.readlines()
+        offset = 0
+        for i, line in enumerate(lines):
+            if line.strip():
+                try:
+                    self._apply(orjson.loads(line))
+                    self._log_records += 1
+                except (orjson.JSONDecodeError, KeyError, AttributeError) as e:
+                    if not any(rest.strip() for rest in lines[i + 1:]):
+                        # A crash mid-append leaves a torn last record; drop it so
+                        # the next append starts on a clean line
+                        print(f"[ConfigurationService] Dropping torn record at byte {offset}: {e}")
+                        try:
+                            os.truncate(STORE_PATH, offset)
+                        except OSError as te:
+                            print(f"[ConfigurationService] Truncate failed: {te}")
+                            self._load_failed = True
+                        return
+                    print(f"[ConfigurationService] Corrupt record at byte {offset}: {e}")
+                    self._load_failed = True
+            offset += len(line)
+        if lines and not lines[-1].endswith(b"\n"):
+            with open(STORE_PATH, "ab") as f:
+                f.write(b"\n")
+
+    def _load_legacy(self):
+        # One-off migration from the single-document JSON store
+        if not LEGACY_STORE_PATH.exists():
+            return
+        try:
+            data = orjson.loads(LEGACY_STORE_PATH.read_bytes())
+            self._configs = {item["id"]: item for item in data}
+        except (orjson.JSONDecodeError, KeyError):
+            self._configs = {}
+            return
+        self._compact(list(self._configs.values()))
+        LEGACY_STORE_PATH.unlink()
+
+    def _apply(self, record: dict):
+        if record.get("deleted"):
+            self._configs.pop(record["id"], None)
+        else:
+            self._configs[record["id"]] = record
+
+    def _append(self, records: list[dict]):
+        with open(STORE_PATH, "ab") as f:
+            start = f.tell()
             try:
-                with open(STORE_PATH) as f:
-                    data = json.load(f)
-                self._configs = {item["id"]: item for item in data}
-            except (json.JSONDecodeError, KeyError):
-                self._configs = {}
-
-    def _save_to_disk(self):
-        with open(STORE_PATH, "w") as f:
-            json.dump(list(self._configs.values()), f, indent=2)
+                f.write(b"".join(orjson.dumps(r) + b"\n" for r in records))
+                f.flush()
+            except OSError:
+                # Don't leave a torn line for the retry to append onto
+                f.truncate(start)
+                raise
+        self._log_records += len(records)
+
+    def _compact(self, items: list[dict]):
+        # Write to a sibling file and rename so readers never see a partial file
+        tmp_path = STORE_PATH.with_suffix(".tmp")
+        tmp_path.write_bytes(b"".join(orjson.dumps(item) + b"\n" for item in items))
+        os.replace(tmp_path, STORE_PATH)
+        self._log_records = len(items)
+
+    def flush(self):
+        """Append pending changes to the log; a no-op when nothing changed."""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                records, self._pending = self._pending, []
+                # Snapshot first: request threads keep saving/deleting meanwhile
+                items = list(self._configs.values())
+            try:
+                if (
+                    not self._load_failed
+                    and self._log_records + len(records) > len(items) + COMPACT_SLACK
+                ):
+                    self._compact(items)
+                else:
+                    self._append(records)
+            except OSError as e:
+                # Keep the changes for the next flush
+                with self._pending_lock:
+                    self._pending[:0] = records
+                print(f"[ConfigurationService] Flush failed: {e}")
 
     def save(
         self,
@@ -38,43 +133,53 @@ class ConfigurationService:
         is_candidate: bool = False,
     ) -> dict:
         config_id = str(uuid.uuid4())[:8]
+        # float() first: round() keeps NumPy scalars, which orjson can't write
         item = {
             "id": config_id,
             "label": label,
-            "values": values,
+            "values": {k: float(v) for k, v in values.items()},
             "model_id": model_id,
-            "predicted_strength": round(predicted_strength, 4),
-            "lower_bound": round(lower_bound, 4) if lower_bound is not None else None,
-            "upper_bound": round(upper_bound, 4) if upper_bound is not None else None,
+            "predicted_strength": round(float(predicted_strength), 4),
+            "lower_bound": round(float(lower_bound), 4) if lower_bound is not None else None,
+            "upper_bound": round(float(upper_bound), 4) if upper_bound is not None else None,
             "is_candidate": is_candidate,
         }
-        self._configs[config_id] = item
-        self._save_to_disk()
+        with self._pending_lock:
+            self._configs[config_id] = item
+            self._pending.append(item)
         return item
 
     def list_all(self) -> list[dict]:
         return list(self._configs.values())
 
     def mark_as_validation_candidate(self, config_id: str) -> dict:
-        if config_id not in self._configs:
-            raise ValueError(f"Configuration '{config_id}' not found")
-        self._configs[config_id]["is_candidate"] = True
-        self._save_to_disk()
-        return self._configs[config_id]
+        with self._pending_lock:
+            if config_id not in self._configs:
+                raise ValueError(f"Configuration '{config_id}' not found")
+            item = self._configs[config_id]
+            item["is_candidate"] = True
+            self._pending.append(item)
+        return item
 
     def delete(self, config_id: str):
-        if config_id not in self._configs:
-            raise ValueError(f"Configuration '{config_id}' not found")
-        del self._configs[config_id]
-        self._save_to_disk()
+        with self._pending_lock:
+            if config_id not in self._configs:
+                raise ValueError(f"Configuration '{config_id}' not found")
+            del self._configs[config_id]
+            self._pending.append({"id": config_id, "deleted": True})
 
     def export_csv(self, only_candidates: bool = False) -> str:
+        return "".join(self.iter_export_csv(only_candidates=only_candidates))
+
+    def iter_export_csv(self, only_candidates: bool = False, chunk_rows: int = 1000):
+        """Yield the CSV export as text chunks of up to ``chunk_rows`` rows."""
         items = self.list_all()
         if only_candidates:
             items = [i for i in items if i.get("is_candidate")]
 
         if not items:
-            return "No configurations to export\n"
+            yield "No configurations to export\n"
+            return
 
         # Collect all value keys
         all_keys = set()
@@ -82,28 +187,31 @@ class ConfigurationService:
             all_keys.update(item["values"].keys())
         value_keys = sorted(all_keys)
 
+        # csv.writer formats each value with str(), so integers in legacy
+        # records stay integers instead of becoming floats in a typed column
         output = io.StringIO()
-        fieldnames = ["id", "label"] + value_keys + [
+        writer = csv.writer(output)
+        writer.writerow(["id", "label"] + value_keys + [
             "predicted_strength", "lower_bound", "upper_bound",
             "model_id", "is_candidate",
-        ]
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for item in items:
-            row = {
-                "id": item["id"],
-                "label": item["label"],
-                "predicted_strength": item["predicted_strength"],
-                "lower_bound": item.get("lower_bound", ""),
-                "upper_bound": item.get("upper_bound", ""),
-                "model_id": item["model_id"],
-                "is_candidate": item["is_candidate"],
-            }
-            for k in value_keys:
-                row[k] = item["values"].get(k, "")
-            writer.writerow(row)
-
-        return output.getvalue()
+        ])
+        for start in range(0, len(items), chunk_rows):
+            writer.writerows(
+                (
+                    item["id"],
+                    item["label"],
+                    *(item["values"].get(k, "") for k in value_keys),
+                    item["predicted_strength"],
+                    item.get("lower_bound", ""),
+                    item.get("upper_bound", ""),
+                    item["model_id"],
+                    item["is_candidate"],
+                )
+                for item in items[start:start + chunk_rows]
+            )
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
 
 
 configuration_service = ConfigurationService()
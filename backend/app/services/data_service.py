@@ -1,13 +1,113 @@
-import io
-import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+import orjson
 import pandas as pd
 import numpy as np
-from ..config import DATA_DIR, DATASETS, UNIFIED_FEATURES, BUILTIN_DATASETS, SUPABASE_URL, SUPABASE_KEY, SUPABASE_BUCKET
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from ..config import ARROW_CACHE_DIR, DATA_DIR, FAST_IO, DATASETS, DatasetSpec, UNIFIED_FEATURES, BUILTIN_DATASETS, SUPABASE_URL, SUPABASE_KEY, SUPABASE_BUCKET
+
+WRITE_BUFFER_SIZE = 1 << 20
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+SIGNED_URL_TTL = 60
+REMOTE_LOAD_WORKERS = 8
+CSV_BLOCK_SIZE = 1 << 20
+# Parquet schema metadata key holding the dataset's DatasetSpec.to_meta()
+PARQUET_META_KEY = b"mdi.dataset"
+
+
+def _write_parquet(path, df: pd.DataFrame, meta: dict) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**table.schema.metadata, PARQUET_META_KEY: orjson.dumps(meta)}
+    )
+    pq.write_table(table, path, compression="snappy")
+
+
+def _read_parquet_meta(path) -> dict | None:
+    raw = (pq.read_schema(path).metadata or {}).get(PARQUET_META_KEY)
+    return orjson.loads(raw) if raw else None
+
+
+def _read_frame(path) -> pd.DataFrame:
+    # Uploaded datasets are stored as parquet; the built-in ones stay CSV
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, engine="pyarrow")
+    if FAST_IO:
+        read_options = pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+        return pacsv.read_csv(path, read_options=read_options).to_pandas()
+    return pd.read_csv(path)
+
+
+STAT_ROWS = ["mean", "std", "min", "max", "25%", "50%", "75%"]
+STAT_KEYS = ["mean", "std", "min", "max", "q25", "q50", "q75"]
+
+
+def _feature_stats(df: pd.DataFrame, cols: list[str]) -> list[dict]:
+    stats = df[cols].describe().loc[STAT_ROWS].to_numpy().round(4).T.tolist()
+    return [
+        {"name": col, **dict(zip(STAT_KEYS, values))}
+        for col, values in zip(cols, stats)
+    ]
+
+
+def _correlations(df: pd.DataFrame, cols: list[str]) -> dict[str, dict[str, float]]:
+    matrix = df[cols].corr().to_numpy().round(4).tolist()
+    return {col: dict(zip(cols, row)) for col, row in zip(cols, matrix)}
+
+
+def _histogram(x: np.ndarray, bins: int) -> tuple[np.ndarray, np.ndarray]:
+    """np.histogram(x, bins) for equal-width bins, counted with one bincount pass."""
+    lo, hi = (float(x.min()), float(x.max())) if x.size else (0.0, 1.0)
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return np.histogram(x, bins=bins)  # raises the usual range error
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    edges = np.linspace(lo, hi, bins + 1)
+    idx = ((x - lo) * (bins / (hi - lo))).astype(np.intp)
+    idx[idx == bins] -= 1
+    # Same edge corrections np.histogram applies to the arithmetic bin index
+    idx[x < edges[idx]] -= 1
+    idx[(x >= edges[idx + 1]) & (idx != bins - 1)] += 1
+    return np.bincount(idx, minlength=bins), edges
+
+
+def _remote_file(name: str, remote_names: set[str]) -> str:
+    # Datasets persisted before the switch to parquet only have a CSV copy
+    # next to their ds_<name>.json metadata
+    if f"ds_{name}.parquet" in remote_names:
+        return f"{name}.parquet"
+    return f"{name}.csv"
+
+
+def _arrow_path(config: DatasetSpec):
+    stem, ext = os.path.splitext(config.file)
+    # The two CSV parsers disagree in the last bit of some floats, so each
+    # keeps its own copy rather than serving the other's after a switch
+    if FAST_IO and ext == ".csv":
+        stem += ".pyarrow"
+    return ARROW_CACHE_DIR / f"{stem}.arrow"
+
+
+def _read_mapped(path) -> pd.DataFrame:
+    # Columns are read-only views over the mapped file, so worker processes
+    # loading the same dataset share its pages instead of each holding a copy
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    try:
+        return table.to_pandas(split_blocks=True, zero_copy_only=True)
+    except pa.ArrowInvalid:
+        # Text or nullable columns can't be viewed in place
+        return table.to_pandas()
 
 
 class DataService:
     def __init__(self):
         self._cache: dict[str, pd.DataFrame] = {}
+        # Derived statistics keyed by (operation, dataset names, *params)
+        self._stats_cache: dict[tuple, object] = {}
         self._storage = None
         if SUPABASE_URL and SUPABASE_KEY:
             try:
@@ -19,22 +119,15 @@ class DataService:
                 print(f"[DataService] Supabase init failed: {e}")
                 self._storage = None
 
-    def _persist_dataset(self, name: str, df: pd.DataFrame) -> None:
+    def _persist_dataset(self, name: str) -> None:
         if not self._storage:
             return
         try:
-            csv_buf = df.to_csv(index=False).encode()
-            self._storage.from_(SUPABASE_BUCKET).upload(
-                f"ds_{name}.csv",
-                csv_buf,
-                file_options={"content-type": "text/csv", "upsert": "true"},
-            )
-            meta = {k: v for k, v in DATASETS[name].items() if k != "file"}
-            meta_buf = json.dumps(meta).encode()
+            # The local parquet file already carries the metadata in its schema
             self._storage.from_(SUPABASE_BUCKET).upload(
-                f"ds_{name}.json",
-                meta_buf,
-                file_options={"content-type": "application/json", "upsert": "true"},
+                f"ds_{name}.parquet",
+                (DATA_DIR / DATASETS[name].file).read_bytes(),
+                file_options={"content-type": "application/vnd.apache.parquet", "upsert": "true"},
             )
         except Exception as e:
             print(f"[DataService] Persist dataset {name} failed: {e}")
@@ -44,6 +137,7 @@ class DataService:
             return
         try:
             self._storage.from_(SUPABASE_BUCKET).remove([
+                f"ds_{name}.parquet",
                 f"ds_{name}.csv",
                 f"ds_{name}.json",
             ])
@@ -55,33 +149,69 @@ class DataService:
             return
         try:
             files = self._storage.from_(SUPABASE_BUCKET).list() or []
-            json_files = [
-                f["name"] for f in files
-                if isinstance(f, dict) and f.get("name", "").startswith("ds_") and f["name"].endswith(".json")
-            ]
+            remote_names = {f.get("name", "") for f in files if isinstance(f, dict)}
+            names = {
+                os.path.splitext(n)[0][3:]  # strip "ds_" prefix and extension
+                for n in remote_names
+                if n.startswith("ds_") and n.endswith((".parquet", ".json"))
+            }
+            names = [name for name in sorted(names) if name not in DATASETS]
             count = 0
-            for jf in json_files:
-                name = jf[3:-5]  # strip "ds_" prefix and ".json" suffix
-                if name in DATASETS:
-                    continue
-                meta_data = self._storage.from_(SUPABASE_BUCKET).download(jf)
-                meta = json.loads(meta_data)
-                csv_data = self._storage.from_(SUPABASE_BUCKET).download(f"ds_{name}.csv")
-                df = pd.read_csv(io.BytesIO(csv_data))
-                csv_path = DATA_DIR / f"{name}.csv"
-                df.to_csv(csv_path, index=False)
-                DATASETS[name] = {
-                    "file": f"{name}.csv",
-                    **meta,
-                }
-                self._cache[name] = df
-                count += 1
+            if names:
+                # Downloads are I/O bound; register results on this thread only
+                with ThreadPoolExecutor(max_workers=min(REMOTE_LOAD_WORKERS, len(names))) as pool:
+                    futures = {
+                        pool.submit(self._load_one_remote, name, _remote_file(name, remote_names)): name
+                        for name in names
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            name, file, df, meta = future.result()
+                        except Exception as e:
+                            print(f"[DataService] Load dataset {futures[future]} failed: {e}")
+                            continue
+                        DATASETS[name] = DatasetSpec(file=file, **meta).with_num_samples(len(df))
+                        self._cache[name] = df
+                        count += 1
             if count:
                 print(f"[DataService] Loaded {count} custom dataset(s) from Supabase")
         except Exception as e:
             print(f"[DataService] Load datasets from Supabase failed: {e}")
 
-    def _get_config(self, name: str) -> dict:
+    def _load_one_remote(self, name: str, file: str) -> tuple[str, str, pd.DataFrame, dict]:
+        path = DATA_DIR / file
+        self._download_to(f"ds_{file}", path)
+        if path.suffix == ".parquet":
+            meta = _read_parquet_meta(path)
+            df = _read_frame(path)
+        else:
+            meta = None
+            df = pd.read_csv(path, engine="pyarrow")
+        if meta is None:
+            meta = orjson.loads(self._storage.from_(SUPABASE_BUCKET).download(f"ds_{name}.json"))
+        return name, file, df, meta
+
+    def _download_to(self, remote_name: str, path) -> None:
+        # Stream through a signed URL so the file never sits fully in memory
+        signed = self._storage.from_(SUPABASE_BUCKET).create_signed_url(remote_name, SIGNED_URL_TTL)
+        # Written beside the target and swapped in whole, so an error page or
+        # a cut-off body never replaces a good local copy
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with httpx.stream("GET", signed["signedURL"], follow_redirects=True, timeout=30) as resp:
+                resp.raise_for_status()
+                with open(tmp, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+                    for chunk in resp.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _invalidate_stats(self, name: str) -> None:
+        for key in [k for k in self._stats_cache if name in k[1]]:
+            del self._stats_cache[key]
+
+    def _get_config(self, name: str) -> DatasetSpec:
         if name not in DATASETS:
             raise ValueError(f"Dataset '{name}' not found. Available: {list(DATASETS.keys())}")
         return DATASETS[name]
@@ -90,23 +220,40 @@ class DataService:
         if name in self._cache:
             return self._cache[name]
         config = self._get_config(name)
-        path = DATA_DIR / config["file"]
-        df = pd.read_csv(path)
+        df = self._load_mapped(config)
         self._cache[name] = df
+        if config.num_samples != len(df):
+            DATASETS[name] = config.with_num_samples(len(df))
         return df
 
+    def _load_mapped(self, config: DatasetSpec) -> pd.DataFrame:
+        source = DATA_DIR / config.file
+        arrow = _arrow_path(config)
+        try:
+            if not arrow.exists() or arrow.stat().st_mtime < source.stat().st_mtime:
+                ARROW_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                tmp = arrow.with_name(f"{arrow.name}.{os.getpid()}.tmp")
+                feather.write_feather(_read_frame(source), tmp, compression="uncompressed")
+                os.replace(tmp, arrow)
+            return _read_mapped(arrow)
+        except (OSError, pa.ArrowException) as e:
+            print(f"[DataService] Arrow cache for {config.file} unavailable: {e}")
+            return _read_frame(source)
+
     def list_datasets(self) -> list[dict]:
         result = []
-        for name, config in DATASETS.items():
-            df = self.load_dataset(name)
+        for name in list(DATASETS):
+            if DATASETS[name].num_samples is None:
+                self.load_dataset(name)
+            config = DATASETS[name]
             result.append({
                 "name": name,
-                "description": config["description"],
-                "source_label": config.get("source_label", name),
-                "features": config["features"],
-                "target": config["target"],
-                "num_samples": len(df),
-                "units": config["units"],
+                "description": config.description,
+                "source_label": config.source_label or name,
+                "features": list(config.features),
+                "target": config.target,
+                "num_samples": config.num_samples,
+                "units": dict(config.units),
             })
         return result
 
@@ -122,19 +269,20 @@ class DataService:
         if not features:
             raise ValueError("No numeric feature columns found besides target")
 
-        csv_path = DATA_DIR / f"{name}.csv"
-        df.to_csv(csv_path, index=False)
+        spec = DatasetSpec(
+            file=f"{name}.parquet",
+            description=description,
+            source_label=name,
+            features=features,
+            target=target,
+            num_samples=len(df),
+        )
+        _write_parquet(DATA_DIR / spec.file, df, spec.to_meta())
 
-        DATASETS[name] = {
-            "file": f"{name}.csv",
-            "description": description,
-            "source_label": name,
-            "features": features,
-            "target": target,
-            "units": {},
-        }
+        DATASETS[name] = spec
         self._cache[name] = df
-        self._persist_dataset(name, df)
+        self._invalidate_stats(name)
+        self._persist_dataset(name)
 
         return {
             "name": name,
@@ -153,43 +301,34 @@ class DataService:
             raise ValueError(f"Dataset '{name}' not found")
         config = DATASETS.pop(name)
         self._cache.pop(name, None)
-        csv_path = DATA_DIR / config["file"]
-        if csv_path.exists():
-            csv_path.unlink()
+        self._invalidate_stats(name)
+        for path in (DATA_DIR / config.file, _arrow_path(config)):
+            if path.exists():
+                path.unlink()
         self._remove_dataset_remote(name)
 
     def get_summary(self, name: str) -> dict:
+        key = ("summary", (name,))
+        if key in self._stats_cache:
+            return self._stats_cache[key]
+
         df = self.load_dataset(name)
         config = self._get_config(name)
-        all_cols = config["features"] + [config["target"]]
-
-        desc = df[all_cols].describe()
-        feature_stats = []
-        for col in all_cols:
-            feature_stats.append({
-                "name": col,
-                "mean": round(float(desc[col]["mean"]), 4),
-                "std": round(float(desc[col]["std"]), 4),
-                "min": round(float(desc[col]["min"]), 4),
-                "max": round(float(desc[col]["max"]), 4),
-                "q25": round(float(desc[col]["25%"]), 4),
-                "q50": round(float(desc[col]["50%"]), 4),
-                "q75": round(float(desc[col]["75%"]), 4),
-            })
+        all_cols = [*config.features, config.target]
 
-        corr = df[all_cols].corr()
-        correlations = {
-            col: {c: round(float(corr.loc[col, c]), 4) for c in all_cols}
-            for col in all_cols
-        }
+        feature_stats = _feature_stats(df, all_cols)
+        # Same matrix the correlations endpoint serves; computed once for both
+        correlations = self.get_correlation_matrix(name)["matrix"]
 
-        return {
+        result = {
             "name": name,
             "num_samples": len(df),
-            "num_features": len(config["features"]),
+            "num_features": len(config.features),
             "feature_stats": feature_stats,
             "correlations": correlations,
         }
+        self._stats_cache[key] = result
+        return result
 
     def get_sample(self, name: str, n: int = 10, offset: int = 0) -> list[dict]:
         df = self.load_dataset(name)
@@ -197,80 +336,88 @@ class DataService:
         return subset.to_dict(orient="records")
 
     def get_feature_distributions(self, name: str, bins: int = 20) -> list[dict]:
+        key = ("distributions", (name,), bins)
+        if key in self._stats_cache:
+            return self._stats_cache[key]
+
         df = self.load_dataset(name)
         config = self._get_config(name)
-        all_cols = config["features"] + [config["target"]]
+        all_cols = [*config.features, config.target]
 
+        data = df[all_cols].to_numpy(dtype=np.float64)
         distributions = []
-        for col in all_cols:
-            counts, bin_edges = np.histogram(df[col].dropna(), bins=bins)
-            dist_bins = []
-            for i in range(len(counts)):
-                dist_bins.append({
-                    "bin_start": round(float(bin_edges[i]), 4),
-                    "bin_end": round(float(bin_edges[i + 1]), 4),
-                    "count": int(counts[i]),
-                })
+        for j, col in enumerate(all_cols):
+            values = data[:, j]
+            counts, bin_edges = _histogram(values[~np.isnan(values)], bins)
+            edges = bin_edges.round(4).tolist()
+            dist_bins = [
+                {"bin_start": start, "bin_end": end, "count": count}
+                for start, end, count in zip(edges[:-1], edges[1:], counts.tolist())
+            ]
             distributions.append({"feature": col, "bins": dist_bins})
 
+        self._stats_cache[key] = distributions
         return distributions
 
     def get_correlation_matrix(self, name: str) -> dict:
+        key = ("correlations", (name,))
+        if key in self._stats_cache:
+            return self._stats_cache[key]
+
         df = self.load_dataset(name)
         config = self._get_config(name)
-        all_cols = config["features"] + [config["target"]]
-        corr = df[all_cols].corr()
-        return {
+        all_cols = [*config.features, config.target]
+        result = {
             "columns": all_cols,
-            "matrix": {
-                col: {c: round(float(corr.loc[col, c]), 4) for c in all_cols}
-                for col in all_cols
-            },
+            "matrix": _correlations(df, all_cols),
         }
+        self._stats_cache[key] = result
+        return result
+
+    def _unified_part(self, name: str) -> pd.DataFrame:
+        """Source-tagged projection of one dataset onto the unified columns."""
+        # Cached per dataset so any subset or ordering of load_unified reuses it
+        key = ("unified_part", (name,))
+        if key in self._stats_cache:
+            return self._stats_cache[key]
+
+        config = self._get_config(name)
+        df = self.load_dataset(name)
+        # Only keep unified features + target that exist in this dataset
+        cols = [f for f in UNIFIED_FEATURES if f in df.columns] + [config.target]
+        if all(pd.api.types.is_numeric_dtype(df[c]) for c in cols):
+            # Fill one float64 block column by column from the (mapped) source
+            # columns instead of copying the whole frame and then casting it
+            values = np.empty((len(df), len(cols)), dtype=np.float64, order="F")
+            for j, c in enumerate(cols):
+                values[:, j] = df[c].to_numpy()
+            part = pd.DataFrame(values, columns=cols, copy=False)
+        else:
+            # Uploaded datasets may have a text target; keep source dtypes
+            part = df[cols].copy()
+        part["source"] = config.source_label or name
+        self._stats_cache[key] = part
+        return part
 
     def load_unified(self, dataset_names: list[str] | None = None) -> dict:
         if dataset_names is None:
             dataset_names = list(DATASETS.keys())
 
-        frames = []
-        for name in dataset_names:
-            config = self._get_config(name)
-            df = self.load_dataset(name).copy()
-            # Only keep unified features + target that exist in this dataset
-            available = [f for f in UNIFIED_FEATURES if f in df.columns]
-            target = config["target"]
-            cols = available + [target]
-            df_sub = df[cols].copy()
-            df_sub["source"] = config.get("source_label", name)
-            frames.append(df_sub)
+        key = ("unified", tuple(dataset_names))
+        if key in self._stats_cache:
+            return self._stats_cache[key]
 
+        frames = [self._unified_part(name) for name in dataset_names]
         merged = pd.concat(frames, ignore_index=True)
         all_cols = UNIFIED_FEATURES + ["compressive_strength"]
         existing = [c for c in all_cols if c in merged.columns]
 
-        desc = merged[existing].describe()
-        feature_stats = []
-        for col in existing:
-            feature_stats.append({
-                "name": col,
-                "mean": round(float(desc[col]["mean"]), 4),
-                "std": round(float(desc[col]["std"]), 4),
-                "min": round(float(desc[col]["min"]), 4),
-                "max": round(float(desc[col]["max"]), 4),
-                "q25": round(float(desc[col]["25%"]), 4),
-                "q50": round(float(desc[col]["50%"]), 4),
-                "q75": round(float(desc[col]["75%"]), 4),
-            })
-
-        corr = merged[existing].corr()
-        correlations = {
-            col: {c: round(float(corr.loc[col, c]), 4) for c in existing}
-            for col in existing
-        }
+        feature_stats = _feature_stats(merged, existing)
+        correlations = _correlations(merged, existing)
 
         sources = merged["source"].value_counts().to_dict()
 
-        return {
+        result = {
             "name": "unified",
             "num_samples": len(merged),
             "num_features": len(UNIFIED_FEATURES),
@@ -279,6 +426,8 @@ class DataService:
             "sources": sources,
             "dataset_names": dataset_names,
         }
+        self._stats_cache[key] = result
+        return result
 
 
 data_service = DataService()
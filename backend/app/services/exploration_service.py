@@ -3,6 +3,17 @@ from .model_service import model_service
 from .xai_service import xai_service
 
 
+def _to_matrix(configs: list[dict[str, float]], feature_index: dict[str, int]) -> np.ndarray:
+    """One row per configuration in model feature order; missing features are 0."""
+    X = np.zeros((len(configs), len(feature_index)))
+    for row, config in enumerate(configs):
+        for feature, value in config.items():
+            j = feature_index.get(feature)
+            if j is not None:
+                X[row, j] = value
+    return X
+
+
 class ExplorationService:
     def parametric_sweep(
         self,
@@ -13,38 +24,36 @@ class ExplorationService:
         max_val: float = 200.0,
         steps: int = 20,
     ) -> dict:
-        entry = model_service.get_model_entry(model_id)
-        feature_names = entry["feature_names"]
+        feature_index = model_service.get_feature_index(model_id)
 
         sweep_values = np.linspace(min_val, max_val, steps)
-        points = []
-        best_pred = -np.inf
+        X = np.tile(_to_matrix([base_config], feature_index), (steps, 1))
+        j = feature_index.get(sweep_feature)
+        if j is not None:
+            X[:, j] = sweep_values
+
+        pred, lower, upper, _ = model_service.predict_batch_with_uncertainty(model_id, X)
+        feature_values = np.round(sweep_values, 4)
+        pred = np.round(pred, 4)
+        points = [
+            {
+                "feature_value": v,
+                "prediction": p,
+                "lower_bound": lo,
+                "upper_bound": hi,
+            }
+            for v, p, lo, hi in zip(
+                feature_values.tolist(), pred.tolist(),
+                np.round(lower, 4).tolist(), np.round(upper, 4).tolist(),
+            )
+        ]
+        best_pred = float(pred.max())
         best_range = [min_val, max_val]
 
-        for val in sweep_values:
-            input_data = {**base_config, sweep_feature: float(val)}
-            # Ensure all features present
-            for f in feature_names:
-                if f not in input_data:
-                    input_data[f] = 0.0
-            result = model_service.predict_with_uncertainty(model_id, input_data)
-            pred = result["prediction"]
-            lower = result["uncertainty"]["lower_bound"]
-            upper = result["uncertainty"]["upper_bound"]
-            points.append({
-                "feature_value": round(float(val), 4),
-                "prediction": round(pred, 4),
-                "lower_bound": round(lower, 4),
-                "upper_bound": round(upper, 4),
-            })
-            if pred > best_pred:
-                best_pred = pred
-
         # Find optimal region (top 10% of predictions)
-        threshold = best_pred * 0.9
-        optimal_vals = [p["feature_value"] for p in points if p["prediction"] >= threshold]
-        if optimal_vals:
-            best_range = [min(optimal_vals), max(optimal_vals)]
+        optimal_vals = feature_values[pred >= best_pred * 0.9]
+        if optimal_vals.size:
+            best_range = [float(optimal_vals.min()), float(optimal_vals.max())]
 
         return {
             "model_id": model_id,
@@ -63,8 +72,7 @@ class ExplorationService:
         base_config: dict[str, float],
         variable_ranges: list[dict],
     ) -> dict:
-        entry = model_service.get_model_entry(model_id)
-        feature_names = entry["feature_names"]
+        feature_index = model_service.get_feature_index(model_id)
 
         if len(variable_ranges) < 2:
             raise ValueError("Need at least 2 variable ranges")
@@ -74,19 +82,17 @@ class ExplorationService:
         vals0 = np.linspace(r0["min_val"], r0["max_val"], r0.get("steps", 20))
         vals1 = np.linspace(r1["min_val"], r1["max_val"], r1.get("steps", 20))
 
-        predictions = []
-        for v1 in vals1:
-            row = []
-            for v0 in vals0:
-                input_data = {**base_config}
-                input_data[r0["feature"]] = float(v0)
-                input_data[r1["feature"]] = float(v1)
-                for f in feature_names:
-                    if f not in input_data:
-                        input_data[f] = 0.0
-                pred = model_service.predict(model_id, input_data)
-                row.append(round(pred, 4))
-            predictions.append(row)
+        # One row per grid point, vals0 varying fastest to match the (vals1, vals0) layout
+        g0, g1 = np.meshgrid(vals0, vals1)
+        X = np.tile(_to_matrix([base_config], feature_index), (g0.size, 1))
+        for feature, grid in ((r0["feature"], g0), (r1["feature"], g1)):
+            j = feature_index.get(feature)
+            if j is not None:
+                X[:, j] = grid.ravel()
+        preds = model_service.predict_batch(model_id, X)
+        predictions = [
+            preds[i:i + len(vals0)] for i in range(0, len(preds), len(vals0))
+        ]
 
         return {
             "model_id": model_id,
@@ -104,24 +110,31 @@ class ExplorationService:
         configurations: list[dict[str, float]],
         labels: list[str],
     ) -> dict:
-        entry = model_service.get_model_entry(model_id)
-        feature_names = entry["feature_names"]
-        results = []
-
-        for config, label in zip(configurations, labels):
-            input_data = {**config}
-            for f in feature_names:
-                if f not in input_data:
-                    input_data[f] = 0.0
-
-            unc_result = model_service.predict_with_uncertainty(model_id, input_data)
-            top_shap = xai_service.get_top_shap(model_id, input_data, top_n=3)
+        feature_names = model_service.get_model_entry(model_id)["feature_names"]
+        # Configurations without a label are not reported, so don't score them
+        configurations = configurations[:len(labels)]
+        if not configurations:
+            return {"model_id": model_id, "results": []}
+        X = _to_matrix(configurations, model_service.get_feature_index(model_id))
+        pred, lower, upper, _ = model_service.predict_batch_with_uncertainty(model_id, X)
 
+        results = []
+        # Identical configurations (e.g. a repeated baseline) share one SHAP call
+        top_shap_by_row: dict[tuple, list[dict]] = {}
+        for row, label, p, lo, hi in zip(
+            X.tolist(), labels,
+            np.round(pred, 4).tolist(), np.round(lower, 4).tolist(), np.round(upper, 4).tolist(),
+        ):
+            key = tuple(row)
+            top_shap = top_shap_by_row.get(key)
+            if top_shap is None:
+                top_shap = xai_service.get_top_shap(model_id, dict(zip(feature_names, row)), top_n=3)
+                top_shap_by_row[key] = top_shap
             results.append({
                 "label": label,
-                "prediction": unc_result["prediction"],
-                "lower_bound": unc_result["uncertainty"]["lower_bound"],
-                "upper_bound": unc_result["uncertainty"]["upper_bound"],
+                "prediction": p,
+                "lower_bound": lo,
+                "upper_bound": hi,
                 "top_shap": top_shap,
             })
 
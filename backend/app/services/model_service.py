@@ -1,7 +1,12 @@
 import io
+import threading
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import joblib
+import orjson
+import zstandard
 from sklearn.ensemble import (
     RandomForestRegressor, GradientBoostingRegressor,
     ExtraTreesRegressor, AdaBoostRegressor,
@@ -12,16 +17,91 @@ from sklearn.neighbors import KNeighborsRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import make_pipeline
 from sklearn.model_selection import train_test_split
+from sklearn.utils import shuffle
 from sklearn.metrics import r2_score, mean_absolute_error, root_mean_squared_error
 from .data_service import data_service
 from ..config import DATASETS, SUPABASE_URL, SUPABASE_KEY, SUPABASE_BUCKET
 
 TREE_ALGORITHMS = {"random_forest", "gradient_boosting", "extra_trees", "adaboost"}
+FOREST_ALGORITHMS = {"random_forest", "extra_trees"}
+PREDICTION_CACHE_SIZE = 2048
+# Rows of X_train KernelExplainer integrates over for non-tree models
+SHAP_BACKGROUND_SIZE = 100
+# Below this the thread pool costs more than fitting the two models in turn
+PARALLEL_QUANTILE_MIN_ESTIMATORS = 50
+ZSTD_LEVEL = 3
+# Bucket object holding each uploaded model's list_models fields
+MODEL_INDEX_NAME = "models_index.json"
+LIST_KEYS = ("algorithm", "params", "r2", "mae", "rmse")
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _dump_entry(entry: dict) -> bytes:
+    buf = io.BytesIO()
+    with zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(buf, closefd=False) as writer:
+        joblib.dump(entry, writer)
+    return buf.getvalue()
+
+
+def _load_entry(data: bytes) -> dict:
+    # Models uploaded before compression was added are plain joblib pickles
+    if not data.startswith(_ZSTD_MAGIC):
+        return joblib.load(io.BytesIO(data))
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+    return joblib.load(io.BufferedReader(reader))
+
+
+# Arrays rebuilt from the dataset on load instead of being uploaded
+SPLIT_KEYS = ("X_train", "X_test", "y_train", "y_test", "y_pred")
+
+
+def _fingerprint(X: np.ndarray, y: np.ndarray) -> str:
+    """Identify the exact training data, so a replayed split can be checked."""
+    return f"{len(X)}:{joblib.hash((X, y))}"
+
+
+def _forest_predict(model, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-tree outputs and the forest's mean prediction for every row of X."""
+    # Query the fitted tree structures directly: DecisionTreeRegressor.predict
+    # re-validates X on every call and the forest dispatches through joblib,
+    # which dominated for 100 trees. The width check is the part of that
+    # validation that matters here: tree_.predict would index past it silently
+    if X.ndim != 2 or X.shape[1] != model.n_features_in_:
+        raise ValueError(
+            f"X has shape {X.shape}, but the model expects (n_samples, {model.n_features_in_})"
+        )
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
+    tree_preds = np.stack([t.tree_.predict(X32)[:, 0] for t in model.estimators_])
+    # Accumulate in estimator order exactly like the forest's predict
+    prediction = np.zeros(len(X32))
+    for row in tree_preds:
+        prediction += row
+    prediction /= len(tree_preds)
+    return tree_preds, prediction
+
+
+def _cache_key(model_id: str, row) -> tuple:
+    # Inputs that agree to 6 decimals share a cached prediction
+    return (model_id, tuple(round(float(v), 6) for v in row))
 
 
 class ModelService:
     def __init__(self):
         self._models: dict[str, dict] = {}
+        # Remote models not yet decoded: model_id -> object name in the bucket
+        self._model_index: dict[str, str] = {}
+        # LIST_KEYS of every uploaded model, mirrored in MODEL_INDEX_NAME
+        self._remote_info: dict[str, dict] = {}
+        self._index_lock = threading.Lock()
+        # One lock per model_id, so a slow download only blocks its own model
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._load_lock = threading.Lock()
+        # LRU caches of single-row results keyed by _cache_key
+        self._pred_cache: OrderedDict[tuple, float] = OrderedDict()
+        self._unc_cache: OrderedDict[tuple, dict] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Uploads run off the request thread; the executor drains its queue at exit
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
         self._storage = None
         if SUPABASE_URL and SUPABASE_KEY:
             try:
@@ -32,20 +112,44 @@ class ModelService:
             except Exception as e:
                 print(f"[ModelService] Supabase init failed: {e}")
 
-    def _persist(self, model_id: str) -> None:
+    def _persist(self, model_id: str) -> Future | None:
         if not self._storage:
-            return
+            return None
+        # Snapshot now, so keys cached on the entry later can't race the pickling
+        entry = {k: v for k, v in self._models[model_id].items() if k not in SPLIT_KEYS}
+        return self._io_pool.submit(self._upload, model_id, entry)
+
+    def _upload(self, model_id: str, entry: dict) -> None:
         try:
-            buf = io.BytesIO()
-            joblib.dump(self._models[model_id], buf)
-            buf.seek(0)
             self._storage.from_(SUPABASE_BUCKET).upload(
                 f"{model_id}.pkl",
-                buf.getvalue(),
+                _dump_entry(entry),
                 file_options={"content-type": "application/octet-stream", "upsert": "true"},
             )
         except Exception as e:
             print(f"[ModelService] Persist {model_id} failed: {e}")
+            return
+        self._update_remote_index({model_id: {k: entry[k] for k in LIST_KEYS}})
+
+    def _read_remote_index(self) -> dict[str, dict]:
+        try:
+            return orjson.loads(self._storage.from_(SUPABASE_BUCKET).download(MODEL_INDEX_NAME))
+        except Exception as e:
+            print(f"[ModelService] Read {MODEL_INDEX_NAME} failed: {e}")
+            return {}
+
+    def _update_remote_index(self, info: dict[str, dict]) -> None:
+        with self._index_lock:
+            # Merge into the stored copy so uploads from other processes survive
+            self._remote_info.update({**self._read_remote_index(), **self._remote_info, **info})
+            try:
+                self._storage.from_(SUPABASE_BUCKET).upload(
+                    MODEL_INDEX_NAME,
+                    orjson.dumps(self._remote_info),
+                    file_options={"content-type": "application/json", "upsert": "true"},
+                )
+            except Exception as e:
+                print(f"[ModelService] Persist {MODEL_INDEX_NAME} failed: {e}")
 
     def _load_all(self) -> None:
         if not self._storage:
@@ -56,12 +160,11 @@ class ModelService:
                 name = f["name"]
                 if not name.endswith(".pkl"):
                     continue
-                model_id = name[:-4]
-                data = self._storage.from_(SUPABASE_BUCKET).download(name)
-                entry = joblib.load(io.BytesIO(data))
-                self._models[model_id] = entry
-            if self._models:
-                print(f"[ModelService] Loaded {len(self._models)} model(s) from Supabase")
+                self._model_index[name[:-4]] = name
+            if any(f["name"] == MODEL_INDEX_NAME for f in files):
+                self._remote_info.update(self._read_remote_index())
+            if self._model_index:
+                print(f"[ModelService] Found {len(self._model_index)} model(s) in Supabase")
         except Exception as e:
             print(f"[ModelService] Load from Supabase failed: {e}")
 
@@ -82,7 +185,7 @@ class ModelService:
             params = {"n_estimators": n_estimators, "random_state": random_state}
             if max_depth is not None:
                 params["max_depth"] = max_depth
-            return RandomForestRegressor(**params), params
+            return RandomForestRegressor(**params, n_jobs=-1), params
 
         if algorithm == "gradient_boosting":
             params = {
@@ -97,7 +200,7 @@ class ModelService:
             params = {"n_estimators": n_estimators, "random_state": random_state}
             if max_depth is not None:
                 params["max_depth"] = max_depth
-            return ExtraTreesRegressor(**params), params
+            return ExtraTreesRegressor(**params, n_jobs=-1), params
 
         if algorithm == "adaboost":
             params = {
@@ -124,6 +227,11 @@ class ModelService:
 
         raise ValueError(f"Unknown algorithm: {algorithm}")
 
+    def _dataset(self) -> tuple[np.ndarray, np.ndarray]:
+        df = data_service.load_dataset("concrete")
+        config = DATASETS["concrete"]
+        return df[list(config.features)].values, df[config.target].values
+
     def train(
         self,
         algorithm: str,
@@ -137,11 +245,8 @@ class ModelService:
         C: float = 1.0,
         n_neighbors: int = 5,
     ) -> dict:
-        df = data_service.load_dataset("concrete")
         config = DATASETS["concrete"]
-        X = df[config["features"]].values
-        y = df[config["target"]].values
-
+        X, y = self._dataset()
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=test_size, random_state=random_state,
         )
@@ -151,7 +256,14 @@ class ModelService:
             random_state, alpha, kernel, C, n_neighbors,
         )
 
-        model.fit(X_train, y_train)
+        # sklearn trees split on float32; casting once spares each fit (and
+        # every boosting stage) its own copy. Scaled pipelines keep float64.
+        X_fit = np.asarray(X_train, dtype=np.float32) if algorithm in TREE_ALGORITHMS else X_train
+        model.fit(X_fit, y_train)
+        if algorithm in FOREST_ALGORITHMS:
+            # Trees are grown on every core; small predict calls stay serial
+            # to avoid dispatching work to the joblib pool
+            model.set_params(n_jobs=None)
         y_pred = model.predict(X_test)
 
         r2 = float(r2_score(y_test, y_pred))
@@ -170,14 +282,26 @@ class ModelService:
             "mae": round(mae, 4),
             "rmse": round(rmse, 4),
             "residual_std": round(residual_std, 4),
+            # Half width of the 95% residual interval, so predictions only add it
+            "ci_half_width": 1.96 * round(residual_std, 4),
             "X_test": X_test,
             "y_test": y_test,
             "y_pred": y_pred,
             "X_train": X_train,
             "y_train": y_train,
-            "feature_names": config["features"],
+            "feature_names": list(config.features),
+            "test_size": test_size,
+            "random_state": random_state,
+            "data_fingerprint": _fingerprint(X, y),
         }
 
+        if algorithm not in TREE_ALGORITHMS:
+            # Same rows shap.sample(X_train, 100) draws, fixed once per model
+            entry["shap_background"] = (
+                X_train if len(X_train) <= SHAP_BACKGROUND_SIZE
+                else shuffle(X_train, n_samples=SHAP_BACKGROUND_SIZE, random_state=0)
+            )
+
         # Train quantile models for GB uncertainty
         if algorithm == "gradient_boosting":
             q_params = {**params}
@@ -190,8 +314,15 @@ class ModelService:
                 loss="quantile", alpha=0.95, **q_params,
                 random_state=random_state,
             )
-            gb_lower.fit(X_train, y_train)
-            gb_upper.fit(X_train, y_train)
+            if n_estimators >= PARALLEL_QUANTILE_MIN_ESTIMATORS:
+                # Tree building releases the GIL, so the two fits overlap
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    fits = [pool.submit(m.fit, X_fit, y_train) for m in (gb_lower, gb_upper)]
+                    for fit in fits:
+                        fit.result()
+            else:
+                gb_lower.fit(X_fit, y_train)
+                gb_upper.fit(X_fit, y_train)
             entry["quantile_lower"] = gb_lower
             entry["quantile_upper"] = gb_upper
 
@@ -207,38 +338,108 @@ class ModelService:
             "rmse": round(rmse, 4),
         }
 
+    def vectorize(self, entry: dict, input_data: dict[str, float]) -> np.ndarray:
+        """Build the (1, n_features) float64 row the model expects."""
+        return np.array([[input_data[f] for f in entry["feature_names"]]], dtype=np.float64)
+
+    def _cached(self, cache: OrderedDict, key: tuple, compute):
+        with self._cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = compute()
+        with self._cache_lock:
+            cache[key] = value
+            if len(cache) > PREDICTION_CACHE_SIZE:
+                cache.popitem(last=False)
+        return value
+
+    def clear_prediction_cache(self, model_id: str | None = None) -> None:
+        with self._cache_lock:
+            for cache in (self._pred_cache, self._unc_cache):
+                if model_id is None:
+                    cache.clear()
+                else:
+                    for key in [k for k in cache if k[0] == model_id]:
+                        del cache[key]
+
     def predict(self, model_id: str, input_data: dict[str, float]) -> float:
         entry = self._get_model(model_id)
-        features = entry["feature_names"]
-        X = np.array([[input_data[f] for f in features]])
-        prediction = entry["model"].predict(X)
-        return round(float(prediction[0]), 4)
+        return self.predict_array(model_id, self.vectorize(entry, input_data))
 
-    def predict_with_uncertainty(self, model_id: str, input_data: dict[str, float]) -> dict:
+    def predict_array(self, model_id: str, X: np.ndarray) -> float:
+        """Predict a single (1, n_features) row already in the model's feature order."""
+        entry = self._get_model(model_id)
+        return self._cached(
+            self._pred_cache, _cache_key(model_id, X[0]),
+            lambda: round(float(self._predict_mean(entry, X)[0]), 4),
+        )
+
+    def predict_batch(self, model_id: str, X: np.ndarray) -> list[float]:
+        """Predict every row of X (columns in the model's feature order) in one call."""
+        entry = self._get_model(model_id)
+        if len(X) == 0:
+            return []
+        return np.round(self._predict_mean(entry, X), 4).tolist()
+
+    def _predict_mean(self, entry: dict, X: np.ndarray) -> np.ndarray:
+        if entry["algorithm"] in FOREST_ALGORITHMS:
+            return _forest_predict(entry["model"], X)[1]
+        return entry["model"].predict(X)
+
+    def predict_batch_with_uncertainty(
+        self, model_id: str, X: np.ndarray, prediction: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return unrounded (prediction, lower, upper, std_dev) arrays for every row of X."""
         entry = self._get_model(model_id)
-        features = entry["feature_names"]
-        X = np.array([[input_data[f] for f in features]])
         model = entry["model"]
         algorithm = entry["algorithm"]
 
-        prediction = float(model.predict(X)[0])
+        if algorithm in FOREST_ALGORITHMS:
+            tree_preds, prediction = _forest_predict(model, X)
+            std_dev = np.std(tree_preds, axis=0)
+            lower, upper = np.percentile(tree_preds, [2.5, 97.5], axis=0)
+            return prediction, lower, upper, std_dev
 
-        if algorithm == "random_forest" or algorithm == "extra_trees":
-            tree_preds = np.array([t.predict(X)[0] for t in model.estimators_])
-            std_dev = float(np.std(tree_preds))
-            lower = float(np.percentile(tree_preds, 2.5))
-            upper = float(np.percentile(tree_preds, 97.5))
-        elif algorithm == "gradient_boosting":
-            lower = float(entry["quantile_lower"].predict(X)[0])
-            upper = float(entry["quantile_upper"].predict(X)[0])
+        if prediction is None:
+            prediction = model.predict(X)
+
+        if algorithm == "gradient_boosting":
+            lower = entry["quantile_lower"].predict(X)
+            upper = entry["quantile_upper"].predict(X)
             std_dev = (upper - lower) / 3.92
         else:
             # Residual-based uncertainty for non-ensemble models
             residual_std = entry.get("residual_std", 0.0)
-            std_dev = residual_std
-            lower = prediction - 1.96 * residual_std
-            upper = prediction + 1.96 * residual_std
+            half_width = entry.get("ci_half_width", 1.96 * residual_std)
+            std_dev = np.full(len(prediction), residual_std)
+            lower = prediction - half_width
+            upper = prediction + half_width
+
+        return prediction, lower, upper, std_dev
 
+    def predict_with_uncertainty(self, model_id: str, input_data: dict[str, float]) -> dict:
+        entry = self._get_model(model_id)
+        X = self.vectorize(entry, input_data)
+        result = self._cached(
+            self._unc_cache, _cache_key(model_id, X[0]),
+            lambda: self._uncertainty_result(model_id, X),
+        )
+        return {
+            **result,
+            "uncertainty": dict(result["uncertainty"]),
+            "input_data": input_data,
+        }
+
+    def _uncertainty_result(self, model_id: str, X: np.ndarray) -> dict:
+        mean = None
+        if self._get_model(model_id)["algorithm"] == "gradient_boosting":
+            # GB bounds come from the quantile models alone, so the mean is
+            # exactly what predict() returns and can be shared through its cache
+            mean = np.array([self.predict_array(model_id, X)])
+        prediction, lower, upper, std_dev = (
+            float(v[0]) for v in self.predict_batch_with_uncertainty(model_id, X, mean)
+        )
         return {
             "prediction": round(prediction, 4),
             "uncertainty": {
@@ -248,7 +449,6 @@ class ModelService:
                 "confidence": 0.95,
             },
             "model_id": model_id,
-            "input_data": input_data,
         }
 
     def get_metrics(self, model_id: str) -> dict:
@@ -259,27 +459,82 @@ class ModelService:
             "r2": entry["r2"],
             "mae": entry["mae"],
             "rmse": entry["rmse"],
-            "actual": [round(float(v), 4) for v in entry["y_test"]],
-            "predicted": [round(float(v), 4) for v in entry["y_pred"]],
+            "actual": np.round(entry["y_test"], 4).tolist(),
+            "predicted": np.round(entry["y_pred"], 4).tolist(),
         }
 
     def list_models(self) -> list[dict]:
+        # Remote models are listed from the index and stay undecoded
+        missing = [mid for mid in list(self._model_index) if mid not in self._remote_info]
+        backfill = {}
+        for mid in missing:
+            # Uploaded before the index existed: decode once and record it
+            try:
+                self._load_remote(mid)
+            except Exception as e:
+                print(f"[ModelService] Load {mid} failed: {e}")
+                continue
+            backfill[mid] = {k: self._models[mid][k] for k in LIST_KEYS}
+        if backfill:
+            self._update_remote_index(backfill)
+        listed = {
+            mid: self._remote_info[mid]
+            for mid in list(self._model_index) if mid in self._remote_info
+        }
+        listed.update(self._models)
         return [
-            {
-                "model_id": mid,
-                "algorithm": entry["algorithm"],
-                "params": entry["params"],
-                "r2": entry["r2"],
-                "mae": entry["mae"],
-                "rmse": entry["rmse"],
-            }
-            for mid, entry in self._models.items()
+            {"model_id": mid, **{k: info[k] for k in LIST_KEYS}}
+            for mid, info in listed.items()
         ]
 
     def get_model_entry(self, model_id: str) -> dict:
         return self._get_model(model_id)
 
+    def get_feature_index(self, model_id: str) -> dict[str, int]:
+        """Column position of each feature in the model's input matrix."""
+        entry = self._get_model(model_id)
+        index = entry.get("feature_index")
+        if index is None:
+            index = {f: j for j, f in enumerate(entry["feature_names"])}
+            entry["feature_index"] = index
+        return index
+
+    def _model_lock(self, model_id: str) -> threading.Lock:
+        with self._load_lock:
+            return self._load_locks.setdefault(model_id, threading.Lock())
+
+    def _load_remote(self, model_id: str) -> None:
+        with self._model_lock(model_id):
+            name = self._model_index.get(model_id)
+            if name is None or model_id in self._models:
+                return
+            data = self._storage.from_(SUPABASE_BUCKET).download(name)
+            entry = _load_entry(data)
+            # Older uploads carry the arrays; slim ones replay the split
+            if "X_test" not in entry:
+                X, y = self._dataset()
+                # The split is only the one the metrics describe if the data is unchanged
+                expected = entry.get("data_fingerprint")
+                if expected is None:
+                    print(f"[ModelService] {model_id} has no dataset fingerprint; split not verified")
+                elif _fingerprint(X, y) != expected:
+                    raise ValueError(
+                        f"Model '{model_id}' was trained on a different version of the dataset"
+                    )
+                X_train, X_test, y_train, y_test = train_test_split(
+                    X, y, test_size=entry["test_size"], random_state=entry["random_state"],
+                )
+                entry.update(
+                    X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test,
+                    y_pred=entry["model"].predict(X_test),
+                )
+            self._models[model_id] = entry
+            del self._model_index[model_id]
+
     def _get_model(self, model_id: str) -> dict:
+        if model_id not in self._models and model_id in self._model_index:
+            # A failed download is an error of its own, not a missing model
+            self._load_remote(model_id)
         if model_id not in self._models:
             raise ValueError(f"Model '{model_id}' not found")
         return self._models[model_id]
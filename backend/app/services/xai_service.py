@@ -1,64 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
 import numpy as np
 import shap
-from .model_service import model_service, TREE_ALGORITHMS
+from .model_service import model_service, TREE_ALGORITHMS, _cache_key
+from ..config import SHAP_CACHE_DIR, SHAP_CACHE_MAX_FILES, XAI_SAMPLE_LIMIT
+
+SHAP_ROW_CACHE_SIZE = 512
+KERNEL_SAMPLE_SIZE = 50
+TREE_PERTURBATION = "tree_path_dependent"
 
 
 class XAIService:
     def __init__(self):
         self._cache: dict[str, dict] = {}
+        # model_id -> (explainer, expected_value as a float)
+        self._explainers: dict[str, tuple] = {}
+        # LRU of single-row SHAP values shared by explain_prediction and get_top_shap
+        self._row_cache: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._row_lock = threading.Lock()
 
-    def _create_explainer(self, model, algorithm, X_train):
-        if algorithm in TREE_ALGORITHMS:
-            return shap.TreeExplainer(model)
-        background = shap.sample(X_train, min(100, len(X_train)))
+    def _create_explainer(self, entry: dict):
+        model = entry["model"]
+        if entry["algorithm"] in TREE_ALGORITHMS:
+            # Path-dependent SHAP walks the trees' own cover counts, so no
+            # background data is needed (or passed) for tree models
+            return shap.TreeExplainer(model, feature_perturbation=TREE_PERTURBATION)
+        background = entry.get("shap_background")
+        if background is None:
+            X_train = entry["X_train"]
+            background = shap.sample(X_train, min(100, len(X_train)))
         return shap.KernelExplainer(model.predict, background)
 
+    def _get_explainer(self, model_id: str) -> tuple:
+        cached = self._explainers.get(model_id)
+        if cached is None:
+            entry = model_service.get_model_entry(model_id)
+            explainer = self._create_explainer(entry)
+            cached = (explainer, float(np.asarray(explainer.expected_value).item()))
+            self._explainers[model_id] = cached
+        return cached
+
+    def _shap_for_input(self, model_id: str, X: np.ndarray) -> np.ndarray:
+        key = _cache_key(model_id, X[0])
+        with self._row_lock:
+            if key in self._row_cache:
+                self._row_cache.move_to_end(key)
+                return self._row_cache[key]
+        explainer, _ = self._get_explainer(model_id)
+        row = np.asarray(explainer.shap_values(X))[0]
+        with self._row_lock:
+            self._row_cache[key] = row
+            if len(self._row_cache) > SHAP_ROW_CACHE_SIZE:
+                self._row_cache.popitem(last=False)
+        return row
+
+    def _disk_cache_path(self, model_id: str, entry: dict):
+        # Keyed on everything the values depend on, so a reused model_id, a
+        # retrained model or a shap upgrade never hits stale values
+        key = (
+            shap.__version__, entry["algorithm"], TREE_PERTURBATION, KERNEL_SAMPLE_SIZE,
+            XAI_SAMPLE_LIMIT, joblib.hash(entry["model"]), entry["X_test"],
+        )
+        return SHAP_CACHE_DIR / f"{model_id}_{joblib.hash(key)[:12]}.joblib"
+
+    def _load_from_disk(self, path) -> dict | None:
+        if not path.exists():
+            return None
+        try:
+            # Uncompressed dumps can be memory-mapped instead of read into RAM
+            result = joblib.load(path, mmap_mode="r")
+            os.utime(path)  # mark as recently used for pruning
+            return result
+        except Exception as e:
+            print(f"[XAIService] Load SHAP cache {path.name} failed: {e}")
+            return None
+
+    def _save_to_disk(self, path, result: dict) -> None:
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            SHAP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Dump beside the target and swap it in, so readers never see a partial file
+            joblib.dump(result, tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            print(f"[XAIService] Save SHAP cache {path.name} failed: {e}")
+            return
+        self._prune_disk_cache()
+
+    def _prune_disk_cache(self) -> None:
+        try:
+            files = sorted(SHAP_CACHE_DIR.glob("*.joblib"), key=lambda p: p.stat().st_mtime)
+            for stale in files[:max(len(files) - SHAP_CACHE_MAX_FILES, 0)]:
+                stale.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"[XAIService] Prune SHAP cache failed: {e}")
+
     def compute_shap_values(self, model_id: str) -> dict:
         if model_id in self._cache:
             return self._cache[model_id]
 
         entry = model_service.get_model_entry(model_id)
-        model = entry["model"]
         X_test = entry["X_test"]
-        X_train = entry["X_train"]
         algorithm = entry["algorithm"]
         feature_names = entry["feature_names"]
 
-        explainer = self._create_explainer(model, algorithm, X_train)
+        cache_path = self._disk_cache_path(model_id, entry)
+        cached = self._load_from_disk(cache_path)
+        if cached is not None:
+            self._cache[model_id] = cached
+            return cached
+
+        explainer, expected_value = self._get_explainer(model_id)
 
         # For non-tree models, sample X_test to keep KernelExplainer fast
-        if algorithm not in TREE_ALGORITHMS:
-            sample_size = min(50, len(X_test))
-            indices = np.random.RandomState(42).choice(
-                len(X_test), sample_size, replace=False,
-            )
+        limit = KERNEL_SAMPLE_SIZE if algorithm not in TREE_ALGORITHMS else None
+        if XAI_SAMPLE_LIMIT and (limit is None or XAI_SAMPLE_LIMIT < limit):
+            limit = XAI_SAMPLE_LIMIT
+        if limit and len(X_test) > limit:
+            # Fresh seed per call, so the rows explained don't depend on call order
+            indices = np.random.RandomState(42).choice(len(X_test), limit, replace=False)
             X_test = X_test[indices]
 
         shap_values = explainer.shap_values(X_test)
 
         result = {
             "shap_values": shap_values,
-            "expected_value": float(np.asarray(explainer.expected_value).item()),
+            "expected_value": expected_value,
             "X_test": X_test,
             "feature_names": feature_names,
         }
         self._cache[model_id] = result
+        self._save_to_disk(cache_path, result)
         return result
 
     def get_summary_plot_data(self, model_id: str) -> dict:
         data = self.compute_shap_values(model_id)
-        shap_values = data["shap_values"]
-        X_test = data["X_test"]
         feature_names = data["feature_names"]
 
-        points = []
-        for i in range(shap_values.shape[0]):
-            for j, feat in enumerate(feature_names):
-                points.append({
-                    "feature": feat,
-                    "shap_value": round(float(shap_values[i, j]), 4),
-                    "feature_value": round(float(X_test[i, j]), 4),
-                })
+        # Derived payloads are cached next to the SHAP values they come from
+        points = data.get("summary_points")
+        if points is None:
+            shap_rows = np.round(data["shap_values"], 4).tolist()
+            value_rows = np.round(data["X_test"], 4).tolist()
+            points = [
+                {"feature": feat, "shap_value": sv, "feature_value": xv}
+                for shap_row, value_row in zip(shap_rows, value_rows)
+                for feat, sv, xv in zip(feature_names, shap_row, value_row)
+            ]
+            data["summary_points"] = points
 
         return {
             "model_id": model_id,
@@ -68,40 +161,37 @@ class XAIService:
 
     def get_feature_importance(self, model_id: str) -> dict:
         data = self.compute_shap_values(model_id)
-        shap_values = data["shap_values"]
-        feature_names = data["feature_names"]
 
-        mean_abs = np.mean(np.abs(shap_values), axis=0)
-        importances = sorted(
-            [
-                {"feature": feat, "importance": round(float(imp), 4)}
-                for feat, imp in zip(feature_names, mean_abs)
-            ],
-            key=lambda x: x["importance"],
-            reverse=True,
-        )
+        importances = data.get("importances")
+        if importances is None:
+            mean_abs = np.mean(np.abs(data["shap_values"]), axis=0)
+            importances = sorted(
+                [
+                    {"feature": feat, "importance": round(float(imp), 4)}
+                    for feat, imp in zip(data["feature_names"], mean_abs)
+                ],
+                key=lambda x: x["importance"],
+                reverse=True,
+            )
+            data["importances"] = importances
 
         return {"model_id": model_id, "importances": importances}
 
     def explain_prediction(self, model_id: str, input_data: dict[str, float]) -> dict:
         entry = model_service.get_model_entry(model_id)
-        model = entry["model"]
-        algorithm = entry["algorithm"]
-        X_train = entry["X_train"]
         feature_names = entry["feature_names"]
-        X = np.array([[input_data[f] for f in feature_names]])
+        X = model_service.vectorize(entry, input_data)
 
-        explainer = self._create_explainer(model, algorithm, X_train)
-        shap_values = explainer.shap_values(X)
+        _, base_value = self._get_explainer(model_id)
+        shap_row = self._shap_for_input(model_id, X)
 
-        prediction = float(model.predict(X)[0])
-        base_value = float(np.asarray(explainer.expected_value).item())
+        prediction = model_service.predict_array(model_id, X)
 
         waterfall = []
         for j, feat in enumerate(feature_names):
             waterfall.append({
                 "feature": feat,
-                "shap_value": round(float(shap_values[0, j]), 4),
+                "shap_value": round(float(shap_row[j]), 4),
                 "feature_value": round(float(X[0, j]), 4),
             })
         waterfall.sort(key=lambda x: abs(x["shap_value"]), reverse=True)
@@ -134,28 +224,34 @@ class XAIService:
         if feature not in feature_names:
             raise ValueError(f"Feature '{feature}' not found")
 
-        feat_idx = feature_names.index(feature)
-        feat_shap = shap_values[:, feat_idx]
-        feat_vals = X_test[:, feat_idx]
-
-        # Find most interacting feature (highest correlation with SHAP values)
-        correlations = []
-        for j, name in enumerate(feature_names):
-            if j == feat_idx:
-                correlations.append(0)
-                continue
-            corr = abs(float(np.corrcoef(X_test[:, j], feat_shap)[0, 1]))
-            correlations.append(corr if not np.isnan(corr) else 0)
-        color_idx = int(np.argmax(correlations))
-        color_feature = feature_names[color_idx]
-
-        points = []
-        for i in range(len(feat_vals)):
-            points.append({
-                "feature_value": round(float(feat_vals[i]), 4),
-                "shap_value": round(float(feat_shap[i]), 4),
-                "color_value": round(float(X_test[i, color_idx]), 4),
-            })
+        dependence = data.setdefault("dependence", {})
+        cached = dependence.get(feature)
+        if cached is None:
+            feat_idx = feature_names.index(feature)
+            feat_shap = shap_values[:, feat_idx]
+            feat_vals = X_test[:, feat_idx]
+
+            # Find most interacting feature (highest correlation with SHAP values),
+            # correlating every column at once; constant columns count as 0
+            centered = X_test - X_test.mean(axis=0)
+            shap_centered = feat_shap - feat_shap.mean()
+            denom = X_test.std(axis=0) * feat_shap.std() * len(feat_shap)
+            correlations = np.abs(centered.T @ shap_centered / np.where(denom == 0, 1, denom))
+            correlations[feat_idx] = 0
+            color_idx = int(np.argmax(np.nan_to_num(correlations)))
+            color_feature = feature_names[color_idx]
+
+            points = [
+                {"feature_value": fv, "shap_value": sv, "color_value": cv}
+                for fv, sv, cv in zip(
+                    np.round(feat_vals, 4).tolist(),
+                    np.round(feat_shap, 4).tolist(),
+                    np.round(X_test[:, color_idx], 4).tolist(),
+                )
+            ]
+            cached = (color_feature, points)
+            dependence[feature] = cached
+        color_feature, points = cached
 
         return {
             "model_id": model_id,
@@ -166,20 +262,16 @@ class XAIService:
 
     def get_top_shap(self, model_id: str, input_data: dict[str, float], top_n: int = 3) -> list[dict]:
         entry = model_service.get_model_entry(model_id)
-        model = entry["model"]
-        algorithm = entry["algorithm"]
-        X_train = entry["X_train"]
         feature_names = entry["feature_names"]
-        X = np.array([[input_data[f] for f in feature_names]])
+        X = model_service.vectorize(entry, input_data)
 
-        explainer = self._create_explainer(model, algorithm, X_train)
-        shap_values = explainer.shap_values(X)
+        shap_row = self._shap_for_input(model_id, X)
 
         items = []
         for j, feat in enumerate(feature_names):
             items.append({
                 "feature": feat,
-                "shap_value": round(float(shap_values[0, j]), 4),
+                "shap_value": round(float(shap_row[j]), 4),
                 "feature_value": round(float(X[0, j]), 4),
             })
         items.sort(key=lambda x: abs(x["shap_value"]), reverse=True)
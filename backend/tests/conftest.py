@@ -0,0 +1,64 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The XAI tests check shapes and orderings, which a subsample of the test
+# split preserves; must be set before app.config is imported
+os.environ.setdefault("XAI_SAMPLE_LIMIT", "100")
+
+from app.services.data_service import DataService
+from app.services.model_service import ModelService
+
+# Forest size for suite-only training; set TEST_N_ESTIMATORS=50 for a full run
+N_ESTIMATORS = int(os.environ.get("TEST_N_ESTIMATORS", 15))
+# Boosting stages are sequential and need ~50 to clear the R² checks
+GB_N_ESTIMATORS = max(N_ESTIMATORS, 50)
+
+
+def _trained_service(algorithm: str, n_estimators: int):
+    svc = ModelService()
+    result = svc.train(algorithm=algorithm, n_estimators=n_estimators, random_state=42)
+    return svc, result
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _cache_dirs(tmp_path_factory):
+    """Keep the SHAP and Arrow caches out of the source tree and out of later runs."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.services.xai_service.SHAP_CACHE_DIR", tmp_path_factory.mktemp("shap_cache"))
+        mp.setattr("app.services.data_service.ARROW_CACHE_DIR", tmp_path_factory.mktemp("arrow_cache"))
+        yield
+
+
+@pytest.fixture(scope="session")
+def data_svc():
+    """One DataService whose loaded frames and statistics the read-only tests share."""
+    return DataService()
+
+
+@pytest.fixture(scope="session")
+def rf_service():
+    """A ModelService holding one random forest, trained once per run."""
+    return _trained_service("random_forest", N_ESTIMATORS)
+
+
+@pytest.fixture(scope="session")
+def gb_service():
+    """A ModelService holding one gradient boosting model, trained once per run."""
+    return _trained_service("gradient_boosting", GB_N_ESTIMATORS)
+
+
+@pytest.fixture(scope="session")
+def shared_rf(rf_service):
+    """(service, model_id) of the session forest, shared by the XAI and exploration tests."""
+    svc, result = rf_service
+    return svc, result["model_id"]
+
+
+@pytest.fixture(scope="session")
+def model_id(shared_rf):
+    return shared_rf[1]
@@ -1,7 +1,12 @@
+import csv
+import io
 import sys
 import json
 from pathlib import Path
 
+import numpy as np
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.services.configuration_service import ConfigurationService, STORE_PATH
@@ -32,6 +37,22 @@ def test_save():
     STORE_PATH.unlink(missing_ok=True)
 
 
+def test_save_numpy_scalars():
+    svc = _fresh_service()
+    item = svc.save(
+        label="NumPy",
+        values={"cement": np.float32(300.5)},
+        model_id="abc123",
+        predicted_strength=np.float64(35.123456),
+        upper_bound=np.float64(41.0),
+    )
+    assert type(item["predicted_strength"]) is float
+    assert type(item["values"]["cement"]) is float
+    svc.flush()
+    assert ConfigurationService().list_all()[0]["predicted_strength"] == 35.1235
+    STORE_PATH.unlink(missing_ok=True)
+
+
 def test_list():
     svc = _fresh_service()
     svc.save(label="A", values={"cement": 300}, model_id="m1", predicted_strength=30)
@@ -64,11 +85,8 @@ def test_delete():
 
 def test_delete_not_found():
     svc = _fresh_service()
-    try:
+    with pytest.raises(ValueError):
         svc.delete("nonexistent")
-        assert False, "Should have raised ValueError"
-    except ValueError:
-        pass
     STORE_PATH.unlink(missing_ok=True)
 
 
@@ -93,9 +111,60 @@ def test_export_csv():
     STORE_PATH.unlink(missing_ok=True)
 
 
+def test_iter_export_csv_chunks():
+    svc = _fresh_service()
+    for i in range(5):
+        svc.save(label=f"R{i}", values={"cement": 300}, model_id="m1", predicted_strength=30)
+
+    chunks = list(svc.iter_export_csv(chunk_rows=2))
+    assert len(chunks) == 3  # header + 2 rows, 2 rows, 1 row
+    assert "".join(chunks) == svc.export_csv()
+    assert len("".join(chunks).strip().split("\n")) == 6
+
+    STORE_PATH.unlink(missing_ok=True)
+
+
+def test_export_csv_exact_bytes():
+    svc = _fresh_service()
+    item = svc.save(label="C1", values={"water": 180, "cement": 300}, model_id="m1",
+                    predicted_strength=35.5, is_candidate=True)
+
+    assert svc.export_csv().encode() == (
+        b"id,label,cement,water,predicted_strength,lower_bound,upper_bound,model_id,is_candidate\r\n"
+        + f"{item['id']},C1,300.0,180.0,35.5,,,m1,True\r\n".encode()
+    )
+
+    STORE_PATH.unlink(missing_ok=True)
+
+
+def test_export_csv_keeps_legacy_integers():
+    # Records written before values were coerced to float hold plain ints,
+    # and a key missing from one record must not turn the column into floats
+    records = [
+        {"id": "old1", "label": "Legacy", "values": {"cement": 300, "age": 28},
+         "model_id": "m1", "predicted_strength": 35, "is_candidate": False},
+        {"id": "old2", "label": "NoAge", "values": {"cement": 250},
+         "model_id": "m1", "predicted_strength": 30, "is_candidate": False},
+    ]
+    STORE_PATH.write_bytes(b"".join(json.dumps(r).encode() + b"\n" for r in records))
+    svc = ConfigurationService()
+
+    expected = io.StringIO()
+    writer = csv.writer(expected)
+    writer.writerow(["id", "label", "age", "cement", "predicted_strength",
+                     "lower_bound", "upper_bound", "model_id", "is_candidate"])
+    writer.writerow(["old1", "Legacy", 28, 300, 35, "", "", "m1", False])
+    writer.writerow(["old2", "NoAge", "", 250, 30, "", "", "m1", False])
+    assert svc.export_csv().encode() == expected.getvalue().encode()
+
+    STORE_PATH.unlink(missing_ok=True)
+
+
 def test_persistence():
     svc = _fresh_service()
     svc.save(label="Persist", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    assert not STORE_PATH.exists()  # writes are deferred until flush
+    svc.flush()
 
     # Create a new instance - should load from disk
     svc2 = ConfigurationService()
@@ -103,3 +172,74 @@ def test_persistence():
     assert len(items) == 1
     assert items[0]["label"] == "Persist"
     STORE_PATH.unlink(missing_ok=True)
+
+
+def test_persistence_replays_updates_and_deletes():
+    svc = _fresh_service()
+    keep = svc.save(label="Keep", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    drop = svc.save(label="Drop", values={"cement": 200}, model_id="m1", predicted_strength=25)
+    svc.flush()
+    svc.mark_as_validation_candidate(keep["id"])
+    svc.delete(drop["id"])
+    svc.flush()
+
+    # Every mutation is one appended line: 2 saves, 1 update, 1 tombstone
+    assert len(STORE_PATH.read_bytes().splitlines()) == 4
+
+    items = ConfigurationService().list_all()
+    assert len(items) == 1
+    assert items[0]["id"] == keep["id"]
+    assert items[0]["is_candidate"] is True
+    STORE_PATH.unlink(missing_ok=True)
+
+
+def test_torn_last_record_dropped():
+    svc = _fresh_service()
+    for label in ("A", "B", "C"):
+        svc.save(label=label, values={"cement": 100}, model_id="m1", predicted_strength=20)
+    svc.flush()
+    with open(STORE_PATH, "ab") as f:
+        f.write(b'{"id": "torn", "lab')
+
+    svc2 = ConfigurationService()
+    assert len(svc2.list_all()) == 3
+    svc2.save(label="D", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    svc2.flush()
+    assert sorted(i["label"] for i in ConfigurationService().list_all()) == ["A", "B", "C", "D"]
+    STORE_PATH.unlink(missing_ok=True)
+
+
+def test_corrupt_middle_record_never_compacted(monkeypatch):
+    svc = _fresh_service()
+    svc.save(label="A", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    svc.flush()
+    with open(STORE_PATH, "ab") as f:
+        f.write(b"not json\n")
+    svc.save(label="B", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    svc.flush()
+
+    monkeypatch.setattr("app.services.configuration_service.COMPACT_SLACK", 0)
+    svc2 = ConfigurationService()
+    assert sorted(i["label"] for i in svc2.list_all()) == ["A", "B"]
+    extra = svc2.save(label="C", values={"cement": 100}, model_id="m1", predicted_strength=20)
+    svc2.delete(extra["id"])
+    svc2.flush()
+    # Appended rather than compacted, so the bad line is still there to inspect
+    assert b"not json" in STORE_PATH.read_bytes()
+    STORE_PATH.unlink(missing_ok=True)
+
+
+def test_failed_flush_keeps_pending(monkeypatch):
+    svc = _fresh_service()
+    item = svc.save(label="A", values={"cement": 100}, model_id="m1", predicted_strength=20)
+
+    def fail(records):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(svc, "_append", fail)
+    svc.flush()
+    assert svc._pending == [item]
+    monkeypatch.undo()
+    svc.flush()
+    assert ConfigurationService().list_all() == [item]
+    STORE_PATH.unlink(missing_ok=True)
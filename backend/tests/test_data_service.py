@@ -3,28 +3,47 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.services.data_service import DataService
+import numpy as np
+import pandas as pd
+import pytest
 
+from app.config import DATA_DIR, DATASETS
+from app.services import data_service as data_service_module
+from app.services.data_service import DataService, _histogram
 
-def test_load_dataset():
-    svc = DataService()
+
+def test_load_dataset(data_svc):
+    svc = data_svc
     df = svc.load_dataset("concrete")
     assert df.shape == (1030, 9)
     assert "cement" in df.columns
     assert "compressive_strength" in df.columns
 
 
+def test_load_dataset_memory_maps_arrow_copy():
+    df = DataService().load_dataset("geopolymer")
+    assert data_service_module._arrow_path(DATASETS["geopolymer"]).exists()
+    pd.testing.assert_frame_equal(df, pd.read_csv(DATA_DIR / "geopolymer.csv"))
+    # Served straight from the mapped file, not an in-process copy
+    assert not df["age"].to_numpy().flags.writeable
+
+
+@pytest.mark.skipif(data_service_module.FAST_IO, reason="pyarrow reader opted into")
+def test_default_reader_parses_like_pandas():
+    # Bit-identical floats keep trained models the same as with pd.read_csv
+    path = DATA_DIR / DATASETS["concrete"].file
+    parsed = data_service_module._read_frame(path)
+    assert np.array_equal(parsed.to_numpy(), pd.read_csv(path).to_numpy())
+
+
 def test_load_dataset_invalid():
     svc = DataService()
-    try:
+    with pytest.raises(ValueError):
         svc.load_dataset("nonexistent")
-        assert False, "Should have raised ValueError"
-    except ValueError:
-        pass
 
 
-def test_list_datasets():
-    svc = DataService()
+def test_list_datasets(data_svc):
+    svc = data_svc
     datasets = svc.list_datasets()
     assert len(datasets) == 3
     names = [d["name"] for d in datasets]
@@ -33,8 +52,8 @@ def test_list_datasets():
     assert "geopolymer" in names
 
 
-def test_list_datasets_multiple():
-    svc = DataService()
+def test_list_datasets_multiple(data_svc):
+    svc = data_svc
     datasets = svc.list_datasets()
     assert len(datasets) == 3
     concrete = [d for d in datasets if d["name"] == "concrete"][0]
@@ -46,8 +65,8 @@ def test_list_datasets_multiple():
     assert geo["num_samples"] == 400
 
 
-def test_get_summary():
-    svc = DataService()
+def test_get_summary(data_svc):
+    svc = data_svc
     summary = svc.get_summary("concrete")
     assert summary["name"] == "concrete"
     assert summary["num_samples"] == 1030
@@ -62,8 +81,8 @@ def test_get_summary():
     assert "compressive_strength" in summary["correlations"]["cement"]
 
 
-def test_get_sample():
-    svc = DataService()
+def test_get_sample(data_svc):
+    svc = data_svc
     sample = svc.get_sample("concrete", n=5)
     assert len(sample) == 5
     assert "cement" in sample[0]
@@ -72,8 +91,8 @@ def test_get_sample():
     assert len(sample_offset) == 5
 
 
-def test_get_feature_distributions():
-    svc = DataService()
+def test_get_feature_distributions(data_svc):
+    svc = data_svc
     distributions = svc.get_feature_distributions("concrete", bins=10)
     assert len(distributions) == 9  # 8 features + target
     dist = distributions[0]
@@ -83,8 +102,8 @@ def test_get_feature_distributions():
     assert dist["bins"][0]["count"] >= 0
 
 
-def test_get_correlation_matrix():
-    svc = DataService()
+def test_get_correlation_matrix(data_svc):
+    svc = data_svc
     result = svc.get_correlation_matrix("concrete")
     assert "columns" in result
     assert "matrix" in result
@@ -93,8 +112,8 @@ def test_get_correlation_matrix():
     assert result["matrix"]["cement"]["cement"] == 1.0
 
 
-def test_load_unified():
-    svc = DataService()
+def test_load_unified(data_svc):
+    svc = data_svc
     result = svc.load_unified()
     assert result["name"] == "unified"
     assert result["num_samples"] == 1030 + 500 + 400
@@ -104,10 +123,77 @@ def test_load_unified():
     assert len(result["feature_stats"]) > 0
 
 
-def test_load_unified_filtered():
-    svc = DataService()
+def test_load_unified_filtered(data_svc):
+    svc = data_svc
     result = svc.load_unified(["concrete", "geopolymer"])
     assert result["num_samples"] == 1030 + 400
     assert len(result["sources"]) == 2
     assert "UCI Concrete" in result["sources"]
     assert "Mendeley Geopolymer" in result["sources"]
+
+
+def test_stats_cache_invalidated():
+    svc = DataService()
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [2.0, 4.0, 7.0]})
+    svc.register_dataset("cache_test", "", "b", df)
+    try:
+        first = svc.get_summary("cache_test")
+        assert svc.get_summary("cache_test") is first
+        unified = svc.load_unified(["concrete", "cache_test"])
+        assert svc.load_unified(["concrete", "cache_test"]) is unified
+    finally:
+        svc.remove_dataset("cache_test")
+    assert not any("cache_test" in key[1] for key in svc._stats_cache)
+
+
+def test_load_unified_with_text_target():
+    svc = DataService()
+    df = pd.DataFrame({"cement": [300.0, 250.0, 400.0], "water": [180, 170, 160],
+                       "grade": ["C25", "C20", "C40"]})
+    svc.register_dataset("text_target", "", "grade", df)
+    try:
+        result = svc.load_unified(["concrete", "text_target"])
+        assert result["num_samples"] == 1030 + 3
+        assert result["sources"]["text_target"] == 3
+        assert svc._unified_part("text_target")["grade"].tolist() == ["C25", "C20", "C40"]
+    finally:
+        svc.remove_dataset("text_target")
+
+
+def test_registered_dataset_stored_as_parquet():
+    svc = DataService()
+    df = pd.DataFrame({"a": [1.5, 2.25, 3.0], "b": [2, 4, 7]})
+    svc.register_dataset("parquet_test", "", "b", df)
+    try:
+        path = DATA_DIR / DATASETS["parquet_test"].file
+        assert path.suffix == ".parquet"
+        # A fresh service has no in-memory copy and must read it back from disk
+        loaded = DataService().load_dataset("parquet_test")
+        pd.testing.assert_frame_equal(loaded, df)
+    finally:
+        svc.remove_dataset("parquet_test")
+    assert not path.exists()
+    assert not (data_service_module.ARROW_CACHE_DIR / "parquet_test.arrow").exists()
+
+
+def test_list_datasets_uses_recorded_num_samples():
+    svc = DataService()
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0, 4.0], "b": [2.0, 4.0, 7.0, 8.0]})
+    svc.register_dataset("count_test", "", "b", df)
+    try:
+        svc._cache.pop("count_test")
+        listed = [d for d in svc.list_datasets() if d["name"] == "count_test"][0]
+        assert listed["num_samples"] == 4
+        assert "count_test" not in svc._cache
+    finally:
+        svc.remove_dataset("count_test")
+
+
+def test_histogram_matches_numpy():
+    rng = np.random.default_rng(0)
+    for x in (rng.normal(size=5000), rng.integers(0, 10, 300).astype(float), np.array([3.0, 3.0]), np.array([])):
+        for bins in (1, 7, 20):
+            counts, edges = _histogram(x, bins)
+            expected_counts, expected_edges = np.histogram(x, bins=bins)
+            assert np.array_equal(counts, expected_counts)
+            assert np.array_equal(edges, expected_edges)
@@ -2,9 +2,10 @@ import sys
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.services.model_service import ModelService
 from app.services.xai_service import XAIService
 from app.services.exploration_service import ExplorationService
 
@@ -19,32 +20,31 @@ SAMPLE_BASE = {
     "age": 28,
 }
 
-_model_svc = ModelService()
-_train_result = _model_svc.train(algorithm="random_forest", n_estimators=50, random_state=42)
-_model_id = _train_result["model_id"]
 _xai_svc = XAIService()
 _exploration_svc = ExplorationService()
 
 
-def _patches():
-    p1 = patch("app.services.exploration_service.model_service", _model_svc)
-    p2 = patch("app.services.exploration_service.xai_service", _xai_svc)
-    p3 = patch("app.services.xai_service.model_service", _model_svc)
-    return p1, p2, p3
+@pytest.fixture(autouse=True, scope="module")
+def _services(shared_rf):
+    """Point exploration_service and xai_service at the session's trained model service."""
+    model_svc = shared_rf[0]
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.services.exploration_service.model_service", model_svc)
+        mp.setattr("app.services.exploration_service.xai_service", _xai_svc)
+        mp.setattr("app.services.xai_service.model_service", model_svc)
+        yield
 
 
-def test_parametric_sweep():
-    p1, p2, p3 = _patches()
-    with p1, p2, p3:
-        result = _exploration_svc.parametric_sweep(
-            model_id=_model_id,
-            base_config=SAMPLE_BASE,
-            sweep_feature="fly_ash",
-            min_val=0,
-            max_val=200,
-            steps=10,
-        )
-    assert result["model_id"] == _model_id
+def test_parametric_sweep(model_id):
+    result = _exploration_svc.parametric_sweep(
+        model_id=model_id,
+        base_config=SAMPLE_BASE,
+        sweep_feature="fly_ash",
+        min_val=0,
+        max_val=200,
+        steps=10,
+    )
+    assert result["model_id"] == model_id
     assert result["sweep_feature"] == "fly_ash"
     assert len(result["points"]) == 10
     point = result["points"][0]
@@ -57,18 +57,16 @@ def test_parametric_sweep():
     assert "end" in result["optimal_region"]
 
 
-def test_multivariable_2d():
-    p1, p2, p3 = _patches()
-    with p1, p2, p3:
-        result = _exploration_svc.multivariable_exploration(
-            model_id=_model_id,
-            base_config=SAMPLE_BASE,
-            variable_ranges=[
-                {"feature": "fly_ash", "min_val": 0, "max_val": 200, "steps": 5},
-                {"feature": "water", "min_val": 120, "max_val": 240, "steps": 5},
-            ],
-        )
-    assert result["model_id"] == _model_id
+def test_multivariable_2d(model_id):
+    result = _exploration_svc.multivariable_exploration(
+        model_id=model_id,
+        base_config=SAMPLE_BASE,
+        variable_ranges=[
+            {"feature": "fly_ash", "min_val": 0, "max_val": 200, "steps": 5},
+            {"feature": "water", "min_val": 120, "max_val": 240, "steps": 5},
+        ],
+    )
+    assert result["model_id"] == model_id
     assert "fly_ash" in result["axes"]
     assert "water" in result["axes"]
     assert len(result["predictions"]) == 5  # rows = steps of var2
@@ -76,19 +74,17 @@ def test_multivariable_2d():
     assert result["variable_names"] == ["fly_ash", "water"]
 
 
-def test_compare_configurations():
+def test_compare_configurations(model_id):
     configs = [
         {**SAMPLE_BASE, "fly_ash": 50},
         {**SAMPLE_BASE, "fly_ash": 150},
     ]
-    p1, p2, p3 = _patches()
-    with p1, p2, p3:
-        result = _exploration_svc.compare_configurations(
-            model_id=_model_id,
-            configurations=configs,
-            labels=["Low FA", "High FA"],
-        )
-    assert result["model_id"] == _model_id
+    result = _exploration_svc.compare_configurations(
+        model_id=model_id,
+        configurations=configs,
+        labels=["Low FA", "High FA"],
+    )
+    assert result["model_id"] == model_id
     assert len(result["results"]) == 2
     r0 = result["results"][0]
     assert r0["label"] == "Low FA"
@@ -96,3 +92,17 @@ def test_compare_configurations():
     assert "lower_bound" in r0
     assert "upper_bound" in r0
     assert len(r0["top_shap"]) == 3
+
+
+def test_compare_configurations_duplicate_shap_once(model_id):
+    configs = [SAMPLE_BASE, {**SAMPLE_BASE, "fly_ash": 150}, dict(SAMPLE_BASE)]
+    with patch.object(_xai_svc, "get_top_shap", wraps=_xai_svc.get_top_shap) as spy:
+        result = _exploration_svc.compare_configurations(
+            model_id=model_id,
+            configurations=configs,
+            labels=["Base", "High FA", "Base again"],
+        )
+    assert spy.call_count == 2
+    first, _, again = result["results"]
+    assert again["top_shap"] == first["top_shap"]
+    assert again["prediction"] == first["prediction"]
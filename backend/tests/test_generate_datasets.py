@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.data.generate_datasets import (
+    DATA_DIR, generate_concrete_xai, generate_geopolymer, write_csv,
+)
+
+
+def test_concrete_xai_csv_is_up_to_date(tmp_path):
+    out = tmp_path / "concrete_xai.csv"
+    write_csv(out, generate_concrete_xai())
+    assert out.read_bytes() == (DATA_DIR / "concrete_xai.csv").read_bytes(), (
+        "concrete_xai.csv is stale; run python -m app.data.generate_datasets"
+    )
+
+
+def test_geopolymer_csv_is_up_to_date(tmp_path):
+    out = tmp_path / "geopolymer.csv"
+    write_csv(out, generate_geopolymer())
+    assert out.read_bytes() == (DATA_DIR / "geopolymer.csv").read_bytes(), (
+        "geopolymer.csv is stale; run python -m app.data.generate_datasets"
+    )
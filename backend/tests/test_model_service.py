@@ -1,9 +1,18 @@
+import io
 import sys
 from pathlib import Path
+from unittest.mock import patch
+
+import joblib
+import numpy as np
+import orjson
+import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from app.services.model_service import ModelService
+from app.services.model_service import (
+    MODEL_INDEX_NAME, SPLIT_KEYS, ModelService, _dump_entry, _load_entry,
+)
 
 SAMPLE_INPUT = {
     "cement": 300.0,
@@ -17,14 +26,8 @@ SAMPLE_INPUT = {
 }
 
 
-def _get_trained_service(algorithm="random_forest"):
-    svc = ModelService()
-    result = svc.train(algorithm=algorithm, n_estimators=50, random_state=42)
-    return svc, result
-
-
-def test_train_random_forest():
-    svc, result = _get_trained_service("random_forest")
+def test_train_random_forest(rf_service):
+    svc, result = rf_service
     assert "model_id" in result
     assert result["algorithm"] == "random_forest"
     assert result["r2"] > 0.85, f"R² should be > 0.85, got {result['r2']}"
@@ -32,38 +35,207 @@ def test_train_random_forest():
     assert result["rmse"] > 0
 
 
-def test_train_gradient_boosting():
-    svc, result = _get_trained_service("gradient_boosting")
+def test_train_gradient_boosting(gb_service):
+    svc, result = gb_service
     assert result["algorithm"] == "gradient_boosting"
     assert result["r2"] > 0.80, f"R² should be > 0.80, got {result['r2']}"
 
 
 def test_train_invalid_algorithm():
     svc = ModelService()
-    try:
+    with pytest.raises(ValueError):
         svc.train(algorithm="invalid")
-        assert False, "Should have raised ValueError"
-    except ValueError:
-        pass
 
 
-def test_predict():
-    svc, result = _get_trained_service()
+def test_predict(rf_service):
+    svc, result = rf_service
     prediction = svc.predict(result["model_id"], SAMPLE_INPUT)
     assert isinstance(prediction, float)
     assert 0 < prediction < 100
 
 
-def test_get_metrics():
-    svc, result = _get_trained_service()
+def test_predict_array(rf_service):
+    svc, result = rf_service
+    features = svc.get_model_entry(result["model_id"])["feature_names"]
+    X = np.array([[SAMPLE_INPUT[f] for f in features]])
+    assert svc.predict_array(result["model_id"], X) == svc.predict(result["model_id"], SAMPLE_INPUT)
+
+
+def test_predict_batch(rf_service):
+    svc, result = rf_service
+    features = svc.get_model_entry(result["model_id"])["feature_names"]
+    other = {**SAMPLE_INPUT, "age": 90}
+    X = np.array([[row[f] for f in features] for row in (SAMPLE_INPUT, other)])
+    predictions = svc.predict_batch(result["model_id"], X)
+    assert predictions == [
+        svc.predict(result["model_id"], SAMPLE_INPUT),
+        svc.predict(result["model_id"], other),
+    ]
+
+
+def test_forest_predict_matches_sklearn(rf_service):
+    svc, result = rf_service
+    entry = svc.get_model_entry(result["model_id"])
+    X = entry["X_test"]
+    assert svc.predict_batch(result["model_id"], X) == np.round(entry["model"].predict(X), 4).tolist()
+
+
+def test_forest_predict_rejects_wrong_width(rf_service):
+    svc, result = rf_service
+    X = svc.get_model_entry(result["model_id"])["X_test"]
+    with pytest.raises(ValueError):
+        svc.predict_batch(result["model_id"], X[:, :-1])
+    with pytest.raises(ValueError):
+        svc.predict_batch_with_uncertainty(result["model_id"], X[0])
+
+
+def test_predict_batch_with_uncertainty(rf_service):
+    svc, result = rf_service
+    features = svc.get_model_entry(result["model_id"])["feature_names"]
+    other = {**SAMPLE_INPUT, "age": 90}
+    X = np.array([[row[f] for f in features] for row in (SAMPLE_INPUT, other)])
+    pred, lower, upper, std_dev = svc.predict_batch_with_uncertainty(result["model_id"], X)
+    assert pred.shape == lower.shape == upper.shape == std_dev.shape == (2,)
+    single = svc.predict_with_uncertainty(result["model_id"], other)
+    assert round(float(pred[1]), 4) == single["prediction"]
+    assert round(float(lower[1]), 4) == single["uncertainty"]["lower_bound"]
+    assert round(float(upper[1]), 4) == single["uncertainty"]["upper_bound"]
+
+
+def test_get_feature_index(rf_service):
+    svc, result = rf_service
+    index = svc.get_feature_index(result["model_id"])
+    features = svc.get_model_entry(result["model_id"])["feature_names"]
+    assert [features[j] for j in index.values()] == list(index)
+    assert svc.get_feature_index(result["model_id"]) is index
+
+
+def test_prediction_cache(rf_service):
+    svc, result = rf_service
+    model_id = result["model_id"]
+    svc.clear_prediction_cache()
+    first = svc.predict_with_uncertainty(model_id, SAMPLE_INPUT)
+    assert svc.predict(model_id, SAMPLE_INPUT) == first["prediction"]
+    assert len(svc._pred_cache) == 1
+    assert len(svc._unc_cache) == 1
+
+    # Hits hand back fresh dicts carrying the caller's input
+    other_input = dict(SAMPLE_INPUT)
+    again = svc.predict_with_uncertainty(model_id, other_input)
+    assert again == first
+    assert again["input_data"] is other_input
+    again["uncertainty"]["lower_bound"] = None
+    assert svc.predict_with_uncertainty(model_id, SAMPLE_INPUT) == first
+
+    svc.clear_prediction_cache(model_id)
+    assert not svc._pred_cache and not svc._unc_cache
+
+
+def test_gb_uncertainty_reuses_cached_mean(gb_service):
+    svc, result = gb_service
+    model_id = result["model_id"]
+    svc.clear_prediction_cache()
+    entry = svc.get_model_entry(model_id)
+    model = entry["model"]
+    expected = round(float(model.predict(svc.vectorize(entry, SAMPLE_INPUT))[0]), 4)
+    with patch.object(model, "predict", wraps=model.predict) as spy:
+        prediction = svc.predict(model_id, SAMPLE_INPUT)
+        unc = svc.predict_with_uncertainty(model_id, SAMPLE_INPUT)
+    assert spy.call_count == 1
+    assert prediction == unc["prediction"] == expected
+
+
+def test_persisted_entry_round_trip(rf_service):
+    svc, result = rf_service
+    entry = svc.get_model_entry(result["model_id"])
+    X = entry["X_test"][:5]
+    expected = entry["model"].predict(X)
+
+    restored = _load_entry(_dump_entry(entry))
+    assert (restored["model"].predict(X) == expected).all()
+
+    # Uncompressed pickles from older uploads still load
+    legacy = io.BytesIO()
+    joblib.dump(entry, legacy)
+    assert (_load_entry(legacy.getvalue())["model"].predict(X) == expected).all()
+
+
+def test_remote_models_load_on_first_use():
+    blobs = {}
+    downloads = []
+
+    class FakeBucket:
+        def list(self):
+            return [{"name": n} for n in blobs]
+
+        def download(self, name):
+            if name != MODEL_INDEX_NAME:
+                downloads.append(name)
+            return blobs[name]
+
+        def upload(self, name, data, file_options=None):
+            blobs[name] = data
+
+    class FakeStorage:
+        def from_(self, bucket):
+            return FakeBucket()
+
+    svc = ModelService()
+    svc._storage = FakeStorage()
+    result = svc.train(algorithm="random_forest", n_estimators=10, random_state=42)
+    entry = svc.get_model_entry(result["model_id"])
+    # Uploads happen in the background; shutting the pool down waits for them
+    svc._io_pool.shutdown(wait=True)
+    assert sorted(blobs) == [f"{result['model_id']}.pkl", MODEL_INDEX_NAME]
+    assert _load_entry(blobs[f"{result['model_id']}.pkl"]).keys().isdisjoint(SPLIT_KEYS)
+
+    lazy = ModelService()
+    lazy._storage = FakeStorage()
+    lazy._load_all()
+    # Listing reads the index instead of decoding models
+    assert lazy.list_models() == svc.list_models()
+    assert downloads == []
+
+    assert lazy.predict(result["model_id"], SAMPLE_INPUT) == svc.predict(result["model_id"], SAMPLE_INPUT)
+    assert len(downloads) == 1
+
+    # The split arrays are replayed from the dataset
+    restored = lazy.get_model_entry(result["model_id"])
+    for key in SPLIT_KEYS:
+        assert (restored[key] == entry[key]).all()
+
+    # ...but only onto the data the model was trained on
+    stale = _load_entry(blobs[f"{result['model_id']}.pkl"])
+    stale["data_fingerprint"] = "0:stale"
+    blobs["stale.pkl"] = _dump_entry(stale)
+    lazy._load_all()
+    with pytest.raises(ValueError, match="different version of the dataset"):
+        lazy.get_model_entry("stale")
+
+    # A failed download surfaces as itself rather than as "not found"
+    lazy._model_index["gone"] = "gone.pkl"
+    with pytest.raises(KeyError):
+        lazy.get_model_entry("gone")
+
+    # Models uploaded before the index existed are decoded once and added to it
+    del blobs[MODEL_INDEX_NAME], blobs["stale.pkl"]
+    legacy = ModelService()
+    legacy._storage = FakeStorage()
+    legacy._load_all()
+    assert legacy.list_models() == svc.list_models()
+    assert orjson.loads(blobs[MODEL_INDEX_NAME]).keys() == {result["model_id"]}
+
+
+def test_get_metrics(rf_service):
+    svc, result = rf_service
     metrics = svc.get_metrics(result["model_id"])
     assert metrics["model_id"] == result["model_id"]
     assert len(metrics["actual"]) == len(metrics["predicted"])
     assert len(metrics["actual"]) > 0
 
 
-def test_list_models():
-    svc, result = _get_trained_service()
+def test_list_models(rf_service):
+    svc, result = rf_service
     models = svc.list_models()
     assert len(models) == 1
     assert models[0]["model_id"] == result["model_id"]
@@ -71,15 +243,12 @@ def test_list_models():
 
 def test_model_not_found():
     svc = ModelService()
-    try:
+    with pytest.raises(ValueError):
         svc.get_metrics("nonexistent")
-        assert False, "Should have raised ValueError"
-    except ValueError:
-        pass
 
 
-def test_predict_with_uncertainty_rf():
-    svc, result = _get_trained_service("random_forest")
+def test_predict_with_uncertainty_rf(rf_service):
+    svc, result = rf_service
     unc = svc.predict_with_uncertainty(result["model_id"], SAMPLE_INPUT)
     assert "prediction" in unc
     assert "uncertainty" in unc
@@ -89,8 +258,8 @@ def test_predict_with_uncertainty_rf():
     assert unc["uncertainty"]["std_dev"] > 0
 
 
-def test_predict_with_uncertainty_gb():
-    svc, result = _get_trained_service("gradient_boosting")
+def test_predict_with_uncertainty_gb(gb_service):
+    svc, result = gb_service
     unc = svc.predict_with_uncertainty(result["model_id"], SAMPLE_INPUT)
     assert "prediction" in unc
     assert "uncertainty" in unc
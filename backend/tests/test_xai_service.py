@@ -1,36 +1,63 @@
+import os
 import sys
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from app.services.model_service import ModelService
 from app.services.xai_service import XAIService
 
-# Train a model once for all tests
-_model_svc = ModelService()
-_train_result = _model_svc.train(algorithm="random_forest", n_estimators=50, random_state=42)
-_model_id = _train_result["model_id"]
 _xai_svc = XAIService()
 
 
-def _patch():
-    """Patch both model_service references used by xai_service."""
-    return patch("app.services.xai_service.model_service", _model_svc)
+@pytest.fixture(autouse=True, scope="module")
+def _services(shared_rf):
+    """Point xai_service at the session's trained model service."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.services.xai_service.model_service", shared_rf[0])
+        yield
 
 
-def test_compute_shap_values():
-    with _patch():
-        result = _xai_svc.compute_shap_values(_model_id)
+def test_compute_shap_values(model_id):
+    result = _xai_svc.compute_shap_values(model_id)
     assert "shap_values" in result
     assert "expected_value" in result
     assert result["shap_values"].shape[1] == 8
 
 
-def test_get_summary_plot_data():
-    with _patch():
-        data = _xai_svc.get_summary_plot_data(_model_id)
-    assert data["model_id"] == _model_id
+def test_compute_shap_values_reloads_from_disk(model_id, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.xai_service.SHAP_CACHE_DIR", tmp_path)
+    first = XAIService().compute_shap_values(model_id)
+    assert [p.suffix for p in tmp_path.iterdir()] == [".joblib"]
+    reloaded = XAIService().compute_shap_values(model_id)
+    assert (reloaded["shap_values"] == first["shap_values"]).all()
+    assert reloaded["expected_value"] == first["expected_value"]
+
+
+def test_disk_cache_keyed_on_shap_version(shared_rf, monkeypatch):
+    svc, model_id = shared_rf
+    entry = svc.get_model_entry(model_id)
+    before = XAIService()._disk_cache_path(model_id, entry)
+    monkeypatch.setattr("app.services.xai_service.shap.__version__", "0.0.0")
+    assert XAIService()._disk_cache_path(model_id, entry) != before
+
+
+def test_disk_cache_pruned_to_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.xai_service.SHAP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr("app.services.xai_service.SHAP_CACHE_MAX_FILES", 2)
+    svc = XAIService()
+    for i in range(4):
+        svc._save_to_disk(tmp_path / f"m{i}.joblib", {"i": i})
+        os.utime(tmp_path / f"m{i}.joblib", (i, i))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["m2.joblib", "m3.joblib"]
+
+
+def test_get_summary_plot_data(model_id):
+    data = _xai_svc.get_summary_plot_data(model_id)
+    assert data["model_id"] == model_id
     assert len(data["points"]) > 0
     point = data["points"][0]
     assert "feature" in point
@@ -38,10 +65,9 @@ def test_get_summary_plot_data():
     assert "feature_value" in point
 
 
-def test_get_feature_importance():
-    with _patch():
-        data = _xai_svc.get_feature_importance(_model_id)
-    assert data["model_id"] == _model_id
+def test_get_feature_importance(model_id):
+    data = _xai_svc.get_feature_importance(model_id)
+    assert data["model_id"] == model_id
     assert len(data["importances"]) == 8
     imps = [item["importance"] for item in data["importances"]]
     assert imps == sorted(imps, reverse=True)
@@ -49,7 +75,16 @@ def test_get_feature_importance():
     assert "cement" in top_features or "age" in top_features
 
 
-def test_explain_prediction():
+def test_shap_aggregates_cached(model_id):
+    importances = _xai_svc.get_feature_importance(model_id)["importances"]
+    points = _xai_svc.get_summary_plot_data(model_id)["points"]
+    assert _xai_svc.get_feature_importance(model_id)["importances"] is importances
+    assert _xai_svc.get_summary_plot_data(model_id)["points"] is points
+    dependence = _xai_svc.get_dependence_data(model_id, "water")
+    assert _xai_svc.get_dependence_data(model_id, "water")["points"] is dependence["points"]
+
+
+def test_explain_prediction(model_id):
     input_data = {
         "cement": 300.0,
         "blast_furnace_slag": 0.0,
@@ -60,8 +95,7 @@ def test_explain_prediction():
         "fine_aggregate": 700.0,
         "age": 28,
     }
-    with _patch():
-        result = _xai_svc.explain_prediction(_model_id, input_data)
+    result = _xai_svc.explain_prediction(model_id, input_data)
     assert "prediction" in result
     assert "base_value" in result
     assert "waterfall" in result
@@ -75,10 +109,49 @@ def test_explain_prediction():
     )
 
 
-def test_get_dependence_data():
-    with _patch():
-        data = _xai_svc.get_dependence_data(_model_id, "cement")
-    assert data["model_id"] == _model_id
+def test_explainer_reused_across_calls(model_id):
+    input_data = {
+        "cement": 300.0,
+        "blast_furnace_slag": 0.0,
+        "fly_ash": 0.0,
+        "water": 180.0,
+        "superplasticizer": 0.0,
+        "coarse_aggregate": 1000.0,
+        "fine_aggregate": 700.0,
+        "age": 28,
+    }
+    svc = XAIService()
+    with patch.object(svc, "_create_explainer", wraps=svc._create_explainer) as spy:
+        first = svc.explain_prediction(model_id, input_data)
+        svc.get_top_shap(model_id, input_data)
+        second = svc.explain_prediction(model_id, input_data)
+    assert spy.call_count == 1
+    assert second == first
+
+
+def test_single_row_shap_shared(model_id):
+    input_data = {
+        "cement": 250.0,
+        "blast_furnace_slag": 0.0,
+        "fly_ash": 0.0,
+        "water": 170.0,
+        "superplasticizer": 2.0,
+        "coarse_aggregate": 1000.0,
+        "fine_aggregate": 750.0,
+        "age": 28,
+    }
+    svc = XAIService()
+    explanation = svc.explain_prediction(model_id, input_data)
+    explainer, _ = svc._get_explainer(model_id)
+    with patch.object(explainer, "shap_values", wraps=explainer.shap_values) as spy:
+        top = svc.get_top_shap(model_id, input_data, top_n=3)
+    assert spy.call_count == 0
+    assert top == explanation["waterfall"][:3]
+
+
+def test_get_dependence_data(model_id):
+    data = _xai_svc.get_dependence_data(model_id, "cement")
+    assert data["model_id"] == model_id
     assert data["feature"] == "cement"
     assert "color_feature" in data
     assert len(data["points"]) > 0
@@ -88,10 +161,27 @@ def test_get_dependence_data():
     assert "color_value" in point
 
 
-def test_dependence_invalid_feature():
-    with _patch():
-        try:
-            _xai_svc.get_dependence_data(_model_id, "nonexistent_feature")
-            assert False, "Should have raised ValueError"
-        except ValueError:
-            pass
+def test_dependence_invalid_feature(model_id):
+    with pytest.raises(ValueError):
+        _xai_svc.get_dependence_data(model_id, "nonexistent_feature")
+
+
+def test_kernel_background_fixed_at_train():
+    import shap
+
+    svc = ModelService()
+    ridge_id = svc.train(algorithm="ridge")["model_id"]
+    entry = svc.get_model_entry(ridge_id)
+    expected = shap.sample(entry["X_train"], min(100, len(entry["X_train"])))
+    assert (entry["shap_background"] == expected).all()
+
+
+def test_sampled_rows_independent_of_call_order(model_id, tmp_path, monkeypatch):
+    # An empty disk cache pruned to zero files makes every call resample
+    monkeypatch.setattr("app.services.xai_service.SHAP_CACHE_DIR", tmp_path)
+    monkeypatch.setattr("app.services.xai_service.SHAP_CACHE_MAX_FILES", 0)
+    first = XAIService().compute_shap_values(model_id)["X_test"]
+    svc = XAIService()
+    svc.compute_shap_values(model_id)
+    svc._cache.clear()
+    assert (svc.compute_shap_values(model_id)["X_test"] == first).all()